@@ -0,0 +1,203 @@
+#command line tool that computes the SLA reports for many supply chain and sales report pairs without the streamlit application
+#usage:
+#   python sla_batch.py reports/ --out sla_output/ --workers 4
+#   python sla_batch.py manifest.csv --out sla_output/
+#   python sla_batch.py reports/ --streaming --chunk-rows 100000
+#   python sla_batch.py reports/ --profile
+#   python sla_batch.py reports/ --sketch-accuracy 0.01
+#   python sla_batch.py reports/ --clock "Business hours" --region "US Federal"
+#a directory is searched for <name>_supply_chain.xlsx/.csv and <name>_sales.xlsx/.csv pairs
+#a manifest is a CSV file with the columns name, supply_chain and sales (file paths are relative to the manifest)
+
+#import necessary packages
+import argparse
+import os
+import sys
+import time
+import traceback
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from sla_calendar import CALENDAR_DAYS, HOLIDAYS_PATH, NO_HOLIDAYS, SLA_CLOCKS, business_calendar, calendar_regions
+from sla_engine import STAGE_NAMES, compute_sla_frames
+from sla_ingest import SALES_COLUMNS, SUPPLY_CHAIN_COLUMNS, parse_report
+from sla_profile import Profiler, profiling, span
+from sla_sketch import SKETCH_BY, sketch_statistics, write_sketches
+from sla_stream import CHUNK_ROWS, compute_sla_frames_streaming
+
+
+#file name endings used to find report pairs in a directory
+SUPPLY_CHAIN_SUFFIX = '_supply_chain'
+SALES_SUFFIX = '_sales'
+REPORT_EXTENSIONS = ('.xlsx', '.csv')
+
+
+#create a function that finds the report pairs in a directory, returns a list of (name, supply chain path, sales path)
+def find_pairs(directory):
+    supply_chain_files = {}
+    sales_files = {}
+    for file_name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(file_name)
+        if extension.lower() not in REPORT_EXTENSIONS:
+            continue
+        if stem.endswith(SUPPLY_CHAIN_SUFFIX):
+            supply_chain_files[stem[:-len(SUPPLY_CHAIN_SUFFIX)]] = os.path.join(directory, file_name)
+        elif stem.endswith(SALES_SUFFIX):
+            sales_files[stem[:-len(SALES_SUFFIX)]] = os.path.join(directory, file_name)
+    #report files without a partner are skipped with a warning
+    for name in sorted(set(supply_chain_files) ^ set(sales_files)):
+        print(f'skipping {name}: missing supply chain or sales report', file=sys.stderr)
+    return [(name, supply_chain_files[name], sales_files[name]) for name in sorted(set(supply_chain_files) & set(sales_files))]
+
+
+#create a function that reads the report pairs listed in a manifest file
+#names must be unique because every pair is written to out_dir/name
+def read_manifest(path):
+    manifest = pd.read_csv(path)
+    duplicates = manifest['name'].astype(str)[manifest['name'].astype(str).duplicated()].unique()
+    if len(duplicates):
+        raise ValueError(f'duplicate names in manifest {path}: {", ".join(duplicates)}')
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [(str(row['name']), os.path.join(base_dir, row['supply_chain']), os.path.join(base_dir, row['sales']))
+            for row in manifest.to_dict('records')]
+
+
+#create a function that reads a report file from disk with the column whitelist of the report type
+def read_report(path, columns):
+    with span(f'load {os.path.basename(path)}') as record, open(path, 'rb') as report_file:
+        parsed = parse_report(report_file.read(), path, columns)
+        record['rows'] = len(parsed)
+        return parsed
+
+
+#create a function that computes the SLA report for one pair and writes the stage tables, statistics and aggregate cube to out_dir/name
+#this runs in a worker process, errors are returned instead of raised so one bad pair does not stop the batch
+#with streaming the supply chain report is read in chunks of chunk_rows rows while it is processed, so reading time is part of the compute time
+#with profile the time, rows and peak memory of every step are written to profile.json and the cProfile statistics to profile.prof
+#with sketch_accuracy the summary statistics are approximated from quantile sketches, which are written to sketches.json so the reports can be merged later
+#clock and region choose the SLA clock and holiday calendar the time elapsed is measured with (see sla_calendar.py)
+def run_job(name, supply_chain_path, sales_path, out_dir, streaming=False, chunk_rows=CHUNK_ROWS, profile=False, sketch_accuracy=None, clock=CALENDAR_DAYS, region=NO_HOLIDAYS):
+    started = time.perf_counter()
+    job = {'name': name, 'supply_chain': supply_chain_path, 'sales': sales_path, 'status': 'ok', 'error': ''}
+    job_dir = os.path.join(out_dir, name)
+    profiler = Profiler(memory=True, cprofile=True) if profile else None
+    try:
+        #profile reading and computing, writing the CSV files is not part of the pipeline
+        with profiling(profiler) if profiler is not None else nullcontext():
+            #read the sales report, and the supply chain report unless it is streamed
+            raw_sales_data = read_report(sales_path, SALES_COLUMNS)
+            if not streaming:
+                raw_supply_chain_data = read_report(supply_chain_path, SUPPLY_CHAIN_COLUMNS)
+            job['read_seconds'] = round(time.perf_counter() - started, 3)
+
+            #compute the SLA dataframes and statistics on the SLA clock
+            calendar = business_calendar(clock, region)
+            if streaming:
+                result = compute_sla_frames_streaming(supply_chain_path, supply_chain_path, raw_sales_data, chunk_rows, calendar)
+            else:
+                result = compute_sla_frames(raw_supply_chain_data, raw_sales_data, calendar=calendar)
+            if sketch_accuracy is not None:
+                with span('quantile sketches'):
+                    result = sketch_statistics(result, sketch_accuracy)
+            job['compute_seconds'] = round(time.perf_counter() - started - job['read_seconds'], 3)
+
+        #write one CSV file per stage, the combined order info and the summary statistics
+        os.makedirs(job_dir, exist_ok=True)
+        for stage_name, df in zip(STAGE_NAMES, result.df_list):
+            df.to_csv(os.path.join(job_dir, f'{stage_name}.csv'), index=False)
+        result.order_info.to_csv(os.path.join(job_dir, 'order_info.csv'), index=False)
+        pd.DataFrame(result.stats, index=STAGE_NAMES).to_csv(os.path.join(job_dir, 'summary_statistics.csv'), index_label='Stage')
+        result.cube.to_csv(os.path.join(job_dir, 'aggregate_cube.csv'))
+        if result.sketches is not None:
+            write_sketches(result.sketches, SKETCH_BY, os.path.join(job_dir, 'sketches.json'))
+        job['references'] = len(result.total_times)
+    except Exception:
+        job['status'] = 'failed'
+        job['error'] = traceback.format_exc()
+    #write the profile, also of failed jobs so the step that failed can be found
+    if profiler is not None:
+        os.makedirs(job_dir, exist_ok=True)
+        with open(os.path.join(job_dir, 'profile.json'), 'w') as profile_file:
+            profile_file.write(profiler.to_json())
+        with open(os.path.join(job_dir, 'profile.prof'), 'wb') as profile_file:
+            profile_file.write(profiler.to_pstats())
+    job['total_seconds'] = round(time.perf_counter() - started, 3)
+    return job
+
+
+#create a function that runs the jobs of some pairs in a process pool, jobs[position] is set for every pair that finished
+#returns the positions of the pairs that did not finish because a worker died (for example running out of memory), which breaks the whole pool
+def run_pool(pairs, positions, jobs, out_dir, workers, job_args):
+    unfinished = set(positions)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, pairs[position][0], pairs[position][1], pairs[position][2], out_dir, *job_args): position for position in positions}
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                job = future.result()
+            #every pending job of a broken pool fails, not only the job of the worker that died
+            except BrokenProcessPool:
+                continue
+            except Exception:
+                job = {'name': pairs[position][0], 'status': 'failed', 'error': traceback.format_exc()}
+            jobs[position] = job
+            unfinished.discard(position)
+            print(f"{job['status']:>6}  {job['name']}  {job.get('total_seconds', '')}s", file=sys.stderr)
+    return sorted(unfinished)
+
+
+#create a function that runs every job in a process pool and returns the job results in the order of the pairs
+#when a worker dies the unfinished pairs are run again one at a time in a pool of their own, so only the pair whose worker died fails
+def run_batch(pairs, out_dir, workers=None, streaming=False, chunk_rows=CHUNK_ROWS, profile=False, sketch_accuracy=None, clock=CALENDAR_DAYS, region=NO_HOLIDAYS):
+    job_args = (streaming, chunk_rows, profile, sketch_accuracy, clock, region)
+    jobs = {}
+    unfinished = run_pool(pairs, range(len(pairs)), jobs, out_dir, workers, job_args)
+    for position in unfinished:
+        if run_pool(pairs, [position], jobs, out_dir, 1, job_args):
+            jobs[position] = {'name': pairs[position][0], 'status': 'failed', 'error': 'the worker process processing this pair died'}
+            print(f"failed  {pairs[position][0]}  worker died", file=sys.stderr)
+    return [jobs[position] for position in range(len(pairs))]
+
+
+#create the command line interface
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute supply chain SLA reports for many supply chain and sales report pairs.')
+    parser.add_argument('source', help='directory of <name>_supply_chain / <name>_sales report pairs, or a manifest CSV with name, supply_chain and sales columns')
+    parser.add_argument('--out', default='sla_output', help='directory the reports are written to (default: sla_output)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--streaming', action='store_true', help='read the supply chain reports in chunks, memory use then grows with the number of shipping reference numbers instead of audit rows')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help=f'audit rows read at a time with --streaming (default: {CHUNK_ROWS})')
+    parser.add_argument('--profile', action='store_true', help='write the time, rows and peak memory of every step to profile.json and the cProfile statistics to profile.prof next to each report')
+    parser.add_argument('--sketch-accuracy', type=float, default=None, help='approximate the summary statistics with quantile sketches of this relative accuracy (for example 0.01) and write them to sketches.json next to each report')
+    parser.add_argument('--clock', choices=SLA_CLOCKS, default=CALENDAR_DAYS, help=f'clock the time elapsed is measured with, working days skip weekends and holidays, business hours also only count the hours of a business day (default: {CALENDAR_DAYS})')
+    parser.add_argument('--region', default=NO_HOLIDAYS, help=f'holiday calendar skipped by the working days and business hours clocks, built in regions or regions of {HOLIDAYS_PATH} (default: {NO_HOLIDAYS})')
+    args = parser.parse_args(argv)
+
+    #check the holiday calendar region before any job is started
+    if args.region not in calendar_regions():
+        parser.error(f'unknown holiday calendar region {args.region!r}, choose one of {", ".join(calendar_regions())}')
+
+    #find the report pairs
+    try:
+        pairs = find_pairs(args.source) if os.path.isdir(args.source) else read_manifest(args.source)
+    except ValueError as error:
+        parser.error(str(error))
+    if not pairs:
+        parser.error(f'no report pairs found in {args.source}')
+
+    #run the jobs and write the job timings and errors next to the reports
+    os.makedirs(args.out, exist_ok=True)
+    jobs = run_batch(pairs, args.out, args.workers, args.streaming, args.chunk_rows, args.profile, args.sketch_accuracy, args.clock, args.region)
+    pd.DataFrame(jobs).to_csv(os.path.join(args.out, 'jobs.csv'), index=False)
+
+    #print the errors of failed jobs and return a non-zero exit code if any job failed
+    failed = [job for job in jobs if job['status'] != 'ok']
+    for job in failed:
+        print(f"\n{job['name']} failed:\n{job['error']}", file=sys.stderr)
+    print(f'{len(jobs) - len(failed)} of {len(jobs)} report pairs processed, results written to {args.out}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#command line tool that times every step of the SLA pipeline on synthetic reports of increasing size
+#usage:
+#   python sla_benchmark.py
+#   python sla_benchmark.py --sizes 1000 10000 --repeat 3 --fail-on-regression
+#   python sla_benchmark.py --sizes 1000 10000 100000 --repeat 3 --update-reference
+#each run is appended to benchmark_results.csv (local history, not tracked) and compared with the previous run of the same size and step,
+#and with the tracked reference results in benchmarks/reference_results.csv, steps slower than either are reported as regressions
+#--update-reference replaces the reference results of the benchmarked sizes with this run, commit the file so every checkout compares against it
+#the throughput of every step is reported in audit rows per second, match_transitions times the status change matcher on its own
+
+#import necessary packages
+import argparse
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import pandas as pd
+from sla_engine import SLAResult, build_aggregate_cube, build_order_info, build_reference_attributes, describe_stages, extract_reference_state, group_days_elapsed, match_transitions, merge_reports, stage_tables_from_state
+from sla_figures import build_section_figures, section_list
+from sla_ingest import SALES_COLUMNS, SUPPLY_CHAIN_COLUMNS, parse_report
+from sla_synthetic import generate_reports
+
+
+#default numbers of audit rows in the generated supply chain reports
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+#file the benchmark results are appended to
+RESULTS_PATH = 'benchmark_results.csv'
+
+#tracked file of the reference results every run is compared with, relative to this file so it is found from any working directory
+REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'reference_results.csv')
+
+#a step is reported as a regression when it is this many times slower than the previous run
+REGRESSION_RATIO = 1.25
+
+#steps faster than this (seconds) are never reported as regressions, their timings are mostly noise
+MIN_REGRESSION_SECONDS = 0.05
+
+
+#create a function that runs a step of the pipeline and records its wall time
+def time_step(timings, step, function, *args):
+    started = time.perf_counter()
+    value = function(*args)
+    timings[step] = time.perf_counter() - started
+    return value
+
+
+#create a function that runs the whole pipeline once on the CSV bytes of a report pair and returns the wall time of every step
+def run_pipeline(supply_chain_bytes, sales_bytes, figure_mode):
+    timings = {}
+    raw_supply_chain_data = time_step(timings, 'ingest', parse_report, supply_chain_bytes, 'supply_chain.csv', SUPPLY_CHAIN_COLUMNS)
+    raw_sales_data = parse_report(sales_bytes, 'sales.csv', SALES_COLUMNS)
+    raw_data = time_step(timings, 'merge', merge_reports, raw_supply_chain_data, raw_sales_data)
+    time_step(timings, 'match_transitions', match_transitions, raw_data)
+    state = time_step(timings, 'transitions', extract_reference_state, raw_data)
+    df_list, total_times = time_step(timings, 'stage_tables', lambda: stage_tables_from_state(state, build_reference_attributes(raw_data)))
+    order_info, order_info_con_ship, order_info_con_accept_ship = time_step(timings, 'order_info', build_order_info, df_list)
+    grouped_df_list = time_step(timings, 'monthly_grouping', group_days_elapsed, df_list)
+    stats = time_step(timings, 'statistics', describe_stages, df_list)
+    cube = time_step(timings, 'aggregate_cube', build_aggregate_cube, df_list)
+    if figure_mode is not None:
+        #build the figures of every section of the page, like a user opening every section once
+        result = SLAResult(df_list, order_info, order_info_con_ship, order_info_con_accept_ship, grouped_df_list, stats, total_times, cube)
+        time_step(timings, 'figures', lambda: [build_section_figures(result, section, figure_mode) for section in section_list])
+    return timings, len(total_times)
+
+
+#create a function that returns the short hash of the current git commit, or an empty string outside a git checkout
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+#create a function that benchmarks every size, keeping the fastest of repeat runs of every step
+def run_benchmarks(sizes, repeat, figure_mode, seed):
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    commit = current_commit()
+    records = []
+    for size in sizes:
+        #generate the reports once per size, the reports are read from CSV bytes so ingestion does not depend on the disk
+        supply_chain, sales = generate_reports(size, seed)
+        supply_chain_bytes = supply_chain.to_csv(index=False).encode()
+        sales_bytes = sales.to_csv(index=False).encode()
+        best = {}
+        for run in range(repeat):
+            timings, references = run_pipeline(supply_chain_bytes, sales_bytes, figure_mode)
+            for step, seconds in timings.items():
+                best[step] = min(seconds, best.get(step, seconds))
+        for step, seconds in best.items():
+            records.append({'run': started_at, 'commit': commit, 'python': platform.python_version(), 'pandas': pd.__version__,
+                            'rows': len(supply_chain), 'size': size, 'references': references, 'step': step, 'seconds': round(seconds, 4)})
+            print(f'{size:>9} rows  {step:<17} {seconds:9.3f}s  {len(supply_chain) / seconds:13,.0f} rows/s', file=sys.stderr)
+    return pd.DataFrame(records)
+
+
+#create a function that keeps the latest run of every size and step
+def latest_results(results):
+    return results.sort_values('run', kind='mergesort').groupby(['size', 'step']).tail(1)
+
+
+#create a function that compares a run with the previous run and the reference results of every size and step
+def compare_with_previous(results, previous, reference=None):
+    comparison = results[['size', 'step', 'seconds']].copy()
+    comparison['rows_per_second'] = (results['rows'] / results['seconds']).round()
+    for name, earlier in [('previous', previous), ('reference', reference)]:
+        if earlier is None or earlier.empty:
+            comparison[f'{name}_seconds'] = float('nan')
+        else:
+            latest = latest_results(earlier)
+            comparison = comparison.merge(latest[['size', 'step', 'seconds']].rename(columns={'seconds': f'{name}_seconds'}), on=['size', 'step'], how='left')
+        comparison[f'{name}_ratio'] = (comparison['seconds'] / comparison[f'{name}_seconds']).round(2)
+    slower = (comparison['previous_ratio'] > REGRESSION_RATIO) | (comparison['reference_ratio'] > REGRESSION_RATIO)
+    comparison['regression'] = slower & (comparison['seconds'] > MIN_REGRESSION_SECONDS)
+    return comparison
+
+
+#create a function that replaces the reference results of the benchmarked sizes with a run, the reference results of other sizes are kept
+def update_reference(results, reference, path):
+    if reference is not None:
+        results = pd.concat([reference[~reference['size'].isin(results['size'])], results], ignore_index=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    results.sort_values(['size', 'run'], kind='mergesort').to_csv(path, index=False)
+
+
+#create the command line interface
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time every step of the SLA pipeline on synthetic reports of increasing size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help=f'numbers of audit rows to benchmark (default: {" ".join(map(str, DEFAULT_SIZES))})')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size, the fastest run of every step is kept (default: 1)')
+    parser.add_argument('--figure-mode', choices=['Full', 'Lightweight', 'None'], default='Lightweight', help="figure mode used to time figure construction, 'None' skips the figures (default: Lightweight)")
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic reports (default: 0)')
+    parser.add_argument('--results', default=RESULTS_PATH, help=f'CSV file the results are appended to (default: {RESULTS_PATH})')
+    parser.add_argument('--reference', default=REFERENCE_PATH, help='tracked CSV file of the reference results every run is compared with (default: benchmarks/reference_results.csv)')
+    parser.add_argument('--update-reference', action='store_true', help='replace the reference results of the benchmarked sizes with this run')
+    parser.add_argument('--fail-on-regression', action='store_true', help='return a non-zero exit code when a step is slower than in the previous run or the reference results')
+    args = parser.parse_args(argv)
+
+    #read the earlier results and the reference results before this run is added
+    previous = pd.read_csv(args.results) if os.path.exists(args.results) else None
+    reference = pd.read_csv(args.reference) if os.path.exists(args.reference) else None
+    results = run_benchmarks(args.sizes, args.repeat, None if args.figure_mode == 'None' else args.figure_mode, args.seed)
+    results.to_csv(args.results, mode='a', header=previous is None, index=False)
+
+    #print the comparison with the previous run and the reference results
+    comparison = compare_with_previous(results, previous, reference)
+    print(comparison.to_string(index=False))
+    regressions = comparison[comparison['regression']]
+    if len(regressions):
+        print(f'\n{len(regressions)} steps are more than {REGRESSION_RATIO}x slower than the previous run or the reference results', file=sys.stderr)
+    if args.update_reference:
+        update_reference(results, reference, args.reference)
+        print(f'reference results of {len(results)} steps written to {args.reference}', file=sys.stderr)
+    return 1 if args.fail_on_regression and len(regressions) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
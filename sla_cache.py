@@ -0,0 +1,70 @@
+#import necessary packages
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+#create a function that hashes the contents of an uploaded file, identical uploads always produce the same key
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+#create a bounded least recently used cache that counts hits and misses
+#streamlit reruns the script on every widget interaction but keeps imported modules loaded, so caches created in this module survive reruns
+class LRUCache:
+
+    def __init__(self, maxsize):
+        #maximum number of entries kept before the least recently used entry is evicted
+        self.maxsize = maxsize
+        #ordered dictionary storing the cached values, most recently used entries are at the end
+        self.entries = OrderedDict()
+        #counters displayed in the application
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        #streamlit runs each user session in its own thread, guard the dictionary with a lock
+        self.lock = threading.Lock()
+
+    #return the cached value for a key, or None if the key is not cached
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                #mark the entry as most recently used
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    #store a value in the cache, evicting the least recently used entries when the cache is full
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    #return the cached keys, least recently used first
+    def keys(self):
+        with self.lock:
+            return list(self.entries)
+
+    #remove every entry from the cache and reset the counters
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    #create a short description of the cache counters for display
+    def summary(self):
+        return f'{self.hits} hits, {self.misses} misses, {self.evictions} evictions, {len(self.entries)}/{self.maxsize} entries'
+
+
+#cache of parsed uploads keyed on the hash of the uploaded bytes
+upload_cache = LRUCache(maxsize=8)
+
+#cache of processed reports keyed on the hashes of the supply chain and sales uploads
+report_cache = LRUCache(maxsize=4)
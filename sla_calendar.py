@@ -0,0 +1,147 @@
+#business calendars of the SLA clock, stage durations can be measured in working days or business hours instead of calendar days
+#a calendar counts the working time between two edit dates as the difference of a cumulative working time, which numpy computes for every edit date at once
+#holiday calendars per region are read from a CSV file with the columns region and date, the file is set with the SLA_HOLIDAYS_PATH environment variable
+#(default: holidays.csv in the working directory), regions that are not in the file use the pandas holiday rules in HOLIDAY_RULES
+#holidays and calendars are built once per version (modification time) of the holidays CSV file, so reruns of the application reuse them
+
+#import necessary packages
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+
+#SLA clocks, calendar days count every day, working days count the whole of every working day, business hours only count BUSINESS_HOURS of every working day
+CALENDAR_DAYS = 'Calendar days'
+WORKING_DAYS = 'Working days'
+BUSINESS_HOURS_CLOCK = 'Business hours'
+SLA_CLOCKS = [CALENDAR_DAYS, WORKING_DAYS, BUSINESS_HOURS_CLOCK]
+
+#start and end hour of a business day, durations on the business hours clock are reported in business days of this length
+BUSINESS_HOURS = (9, 17)
+
+#days of the week that are working days, in the numpy weekmask format
+WEEKMASK = 'Mon Tue Wed Thu Fri'
+
+#region without holidays, only weekends are skipped
+NO_HOLIDAYS = 'Weekends only'
+
+#regions whose holidays are generated from pandas holiday rules
+HOLIDAY_RULES = {'US Federal': USFederalHolidayCalendar}
+
+#years the holiday rules are generated for
+HOLIDAY_YEARS = (2000, 2099)
+
+#CSV file of the holidays of other regions
+HOLIDAYS_PATH = os.environ.get('SLA_HOLIDAYS_PATH', 'holidays.csv')
+
+#day the cumulative working time is counted from
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+#int64 value of a missing edit date
+MISSING = np.iinfo(np.int64).min
+
+#nanoseconds in an hour
+HOUR = 3600 * 10**9
+
+
+#create a class that measures working time on working days between a start and end hour, skipping weekends and holidays
+@dataclass(frozen=True)
+class BusinessCalendar:
+    #name shown to the user, also part of the report cache key
+    name: str
+    #holidays as a tuple of 'YYYY-MM-DD' strings
+    holidays: tuple = ()
+    #start and end hour of the working time of a working day, (0, 24) counts the whole day
+    hours: tuple = (0, 24)
+    #days of the week that are working days
+    weekmask: str = WEEKMASK
+    #version of the holidays CSV file the holidays were read from, also part of the report cache key
+    version: int = None
+
+    #length of the working time of a working day (nanoseconds), working time is reported in days of this length
+    @property
+    def day_length(self):
+        return int((self.hours[1] - self.hours[0]) * HOUR)
+
+    #numpy business day calendar of the weekmask and holidays, built once per calendar
+    @property
+    def busdaycalendar(self):
+        if '_busdaycalendar' not in self.__dict__:
+            object.__setattr__(self, '_busdaycalendar', np.busdaycalendar(weekmask=self.weekmask, holidays=np.array(self.holidays, dtype='datetime64[D]')))
+        return self.__dict__['_busdaycalendar']
+
+    #compute the working time (nanoseconds) from EPOCH to every edit date (int64 nanoseconds)
+    #working days before the day of the edit date count in full, the day of the edit date counts up to the edit time, missing edit dates stay missing
+    def working_time(self, times):
+        missing = times == MISSING
+        days = np.where(missing, 0, times).view('datetime64[ns]').astype('datetime64[D]')
+        whole_days = np.busday_count(EPOCH, days, busdaycal=self.busdaycalendar)
+        time_of_day = times - days.astype('datetime64[ns]').view('i8')
+        start, end = int(self.hours[0] * HOUR), int(self.hours[1] * HOUR)
+        today = np.where(np.is_busday(days, busdaycal=self.busdaycalendar), np.clip(time_of_day, start, end) - start, 0)
+        return np.where(missing, MISSING, whole_days * self.day_length + today)
+
+
+#create a function that returns the version of the holidays CSV file (its modification time in nanoseconds), None when there is no file
+def holiday_file_version(path=HOLIDAYS_PATH):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+#create a function that reads one version of the holidays CSV file, returns a dictionary of region: tuple of dates
+@lru_cache(maxsize=8)
+def read_holiday_version(path, version):
+    if version is None:
+        return {}
+    holidays = pd.read_csv(path, parse_dates=['date'])
+    return {str(region): tuple(dates.dt.strftime('%Y-%m-%d').sort_values().unique()) for region, dates in holidays.groupby('region')['date']}
+
+
+#create a function that reads the holidays of every region from the current version of the holidays CSV file
+def read_holiday_file(path=HOLIDAYS_PATH):
+    return read_holiday_version(path, holiday_file_version(path))
+
+
+#create a function that generates the holidays of a region from its pandas holiday rules
+@lru_cache(maxsize=None)
+def rule_holidays(region):
+    dates = HOLIDAY_RULES[region]().holidays(f'{HOLIDAY_YEARS[0]}-01-01', f'{HOLIDAY_YEARS[1]}-12-31')
+    return tuple(dates.strftime('%Y-%m-%d'))
+
+
+#create a function that lists the regions with a holiday calendar
+def calendar_regions(path=HOLIDAYS_PATH):
+    return [NO_HOLIDAYS] + list(HOLIDAY_RULES) + [region for region in read_holiday_file(path) if region not in HOLIDAY_RULES]
+
+
+#create a function that returns the holidays of a region, the holidays CSV file wins over the pandas holiday rules
+def region_holidays(region, path=HOLIDAYS_PATH):
+    holidays = read_holiday_file(path)
+    if region in holidays:
+        return holidays[region]
+    if region in HOLIDAY_RULES:
+        return rule_holidays(region)
+    if region == NO_HOLIDAYS:
+        return ()
+    raise ValueError(f'unknown holiday calendar region {region!r}, choose one of {", ".join(calendar_regions(path))}')
+
+
+#create a function that builds the business calendar of an SLA clock and region for one version of the holidays CSV file
+@lru_cache(maxsize=16)
+def build_calendar(clock, region, path, version):
+    hours = BUSINESS_HOURS if clock == BUSINESS_HOURS_CLOCK else (0, 24)
+    return BusinessCalendar(name=f'{clock} ({region})', holidays=region_holidays(region, path), hours=hours, version=version)
+
+
+#create a function that returns the business calendar of an SLA clock and region, returns None for the calendar days clock
+def business_calendar(clock, region=NO_HOLIDAYS, path=HOLIDAYS_PATH):
+    if clock == CALENDAR_DAYS:
+        return None
+    if clock not in SLA_CLOCKS:
+        raise ValueError(f'unknown SLA clock {clock!r}, choose one of {", ".join(SLA_CLOCKS)}')
+    return build_calendar(clock, region, path, holiday_file_version(path))
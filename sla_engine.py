@@ -0,0 +1,675 @@
+#import necessary packages
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+from sla_profile import span
+
+
+#name of the column holding the shipping reference numbers in the supply chain report
+REF_COL = 'Shipping Details: Ref No.'
+
+#names of the seven stage dataframes in df_list, in order, used when the stages are saved or stored
+#these follow the 'Order Status Change' values of each dataframe (the fourth dataframe holds accepted to shipped times, the fifth confirmed to shipped times)
+STAGE_NAMES = ['closed_won_to_created', 'created_to_confirmed', 'confirmed_to_accepted', 'accepted_to_shipped', 'confirmed_to_shipped', 'out_of_stock', 'total_order_time']
+
+#columns of the merged dataframe that describe a shipping reference number, and the names they are given in the stage dataframes
+REFERENCE_ATTRIBUTES = {
+    'Account Name_x': 'Account Name',
+    'Opportunity': 'Opportunity Name',
+    'Opportunity Type': 'Opportunity Type',
+    'Asset Type': 'Asset Type',
+    'Closed won date': 'Closed Won',
+}
+
+#columns of the sales report joined onto the audit rows (after 'Opportunity Name' is renamed to 'Opportunity')
+SALES_JOIN_COLUMNS = ['Opportunity', 'Closed won date', 'Opportunity Type', 'Asset Type']
+
+#account name of the sales demo orders, these orders are removed from the merged dataframe
+DEMO_ACCOUNT = 'MCFNA Sales Demo Account'
+
+#default values of the flag columns for shipping reference numbers that are not in the flag dictionaries
+FLAG_DEFAULTS = {
+    'Order Shipped': 'Yes',
+    'Cancelled Order': 'No',
+    'Order Out of Stock': 'No',
+    'Asset Type': 'N/A',
+    'Opportunity Type': 'N/A',
+}
+
+#columns the aggregate cube breaks every stage and month down by
+CUBE_DIMENSIONS = ['Account Name', 'Opportunity Type', 'Asset Type']
+
+#month, dimension and value of the aggregate cube rows that cover every month, or every order of a stage and month
+ALL = 'All'
+
+#quantiles of the time elapsed kept in the aggregate cube
+CUBE_QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p95': 0.95, 'p99': 0.99}
+
+#create a class that describes one status change of the audit trail, an audit row matches the rule when each of its listed columns holds one of the listed values
+#a column left as None matches any value
+@dataclass(frozen=True)
+class TransitionRule:
+    #name of the status change, used as the 'Transition' value of matched rows and as the state column
+    name: str
+    #matching 'Field / Event' values
+    field_events: tuple = None
+    #matching 'Old Value' values
+    old_values: tuple = None
+    #matching 'New Value' values
+    new_values: tuple = None
+
+    #check one combination of 'Field / Event', 'Old Value' and 'New Value'
+    def matches(self, field_event, old_value, new_value):
+        return all(values is None or value in values for values, value in ((self.field_events, field_event), (self.old_values, old_value), (self.new_values, new_value)))
+
+
+#status changes counted by the SLA stages, in the order they are checked, a new status change only needs a new rule here
+TRANSITION_RULES = [
+    #rows where an order is created
+    TransitionRule('created', field_events=('Created.',)),
+    #rows where an order is confirmed
+    TransitionRule('confirmed', old_values=('Not confirmed',), new_values=('Confirmed',)),
+    #rows where an order is accepted (from confirmed or from out of stock)
+    TransitionRule('accepted', old_values=('Confirmed', 'Out of stock'), new_values=('Order accepted',)),
+    #rows where out of stock is entered as the new value
+    TransitionRule('nv_out_of_stock', new_values=('Out of stock',)),
+    #rows where the order changes from out of stock
+    TransitionRule('ov_out_of_stock', old_values=('Out of stock',)),
+    #rows where an order is accepted to shipped
+    TransitionRule('shipped', old_values=('Order accepted',), new_values=('Shipped',)),
+]
+
+#audit columns the transition rules match on, in the order of the TransitionRule.matches arguments
+MATCH_COLUMNS = ['Field / Event', 'Old Value', 'New Value']
+
+#names of the status change columns created by extract_transitions, in the order they are checked
+TRANSITION_COLUMNS = [rule.name for rule in TRANSITION_RULES]
+
+#transition rules of entering and leaving out of stock, used to pair every stock-out of a shipping reference number
+OUT_OF_STOCK_RULES = [rule for rule in TRANSITION_RULES if rule.name in ('nv_out_of_stock', 'ov_out_of_stock')]
+
+#state columns of the stock-outs of a shipping reference number: start of the first and end of the last stock-out, number of stock-outs, and total and longest stock-out (timedeltas)
+OUT_OF_STOCK_COLUMNS = ['out_of_stock_start', 'out_of_stock_end', 'out_of_stock_count', 'out_of_stock_total', 'out_of_stock_longest']
+
+#columns of the state of a shipping reference number
+STATE_COLUMNS = TRANSITION_COLUMNS + OUT_OF_STOCK_COLUMNS + ['cancelled']
+
+#columns only the out of stock dataframe has, they are left out of the order info dataframes
+OUT_OF_STOCK_DETAIL_COLUMNS = ['Out of Stock Count', 'Longest Out of Stock (Days)']
+
+#fields of the transition record of a shipping reference number, edit dates as int64 nanoseconds with NAT for missing dates
+#stock-out durations are int64 nanoseconds
+TRANSITION_RECORD = np.dtype([(name, 'i8') for name in TRANSITION_COLUMNS + ['closed_won'] + OUT_OF_STOCK_COLUMNS] + [('cancelled', '?')])
+
+#missing edit date in a transition record, the int64 value of NaT
+NAT = np.iinfo(np.int64).min
+
+#status change of every stage dataframe (in the order of the first six STAGE_NAMES) and the record fields of its start and end edit dates and of its date
+STAGE_TRANSITIONS = {
+    'Closed Won to Created': ('closed_won', 'created', 'created'),
+    'Created to Confirmed': ('created', 'confirmed', 'confirmed'),
+    'Confirmed to Accepted': ('confirmed', 'accepted', 'accepted'),
+    'Accepted to Shipped': ('accepted', 'shipped', 'shipped'),
+    'Confirmed to Shipped': ('confirmed', 'shipped', 'shipped'),
+    #the time elapsed of out of stock is the total of every stock-out between the start of the first and the end of the last stock-out
+    'Out of Stock': ('out_of_stock_start', 'out_of_stock_end', 'out_of_stock_start'),
+}
+
+#stages added up into the total order time
+TOTAL_TIME_STAGES = ['Closed Won to Created', 'Created to Confirmed', 'Confirmed to Accepted', 'Accepted to Shipped']
+
+
+#create a function that compiles transition rules against the audit trail
+#every distinct ('Field / Event', 'Old Value', 'New Value') combination gets an integer code and the rules are only checked once per combination
+#returns the combination code of every audit row and a lookup table of which rules each combination matches (combinations x rules)
+def compile_transition_matcher(raw_data, rules=TRANSITION_RULES):
+    #code the combinations one column at a time, factorizing after every column keeps the codes below the number of rows
+    combination_codes = np.zeros(len(raw_data), dtype=np.int64)
+    for column in MATCH_COLUMNS:
+        column_codes, column_values = pd.factorize(raw_data[column])
+        combination_codes, combinations = pd.factorize(combination_codes * (len(column_values) + 1) + column_codes + 1)
+    #check the rules against the first audit row of every combination, missing values are checked as None
+    first_rows = np.unique(combination_codes, return_index=True)[1]
+    values = raw_data[MATCH_COLUMNS].iloc[first_rows].astype(object)
+    values = values.where(values.notna(), None)
+    lookup = np.array([[rule.matches(*combination) for rule in rules] for combination in values.itertuples(index=False, name=None)], dtype=bool).reshape(len(first_rows), len(rules))
+    return combination_codes, lookup
+
+
+#create a function that finds the audit rows of every status change in one pass over the audit trail
+#returns a long dataframe with the key columns, the status change name ('Transition') and the edit date of the last matching row per key and status change
+def match_transitions(raw_data, keys=(REF_COL,), rules=TRANSITION_RULES):
+    #look the rules of every audit row up in one step, only rows whose combination matches a rule are kept
+    combination_codes, lookup = compile_transition_matcher(raw_data, rules)
+    candidates = np.flatnonzero(lookup.any(axis=1)[combination_codes])
+
+    #list the matching rows of every status change, status change by status change and keeping the original row order within each status change
+    rule_positions, candidate_positions = np.nonzero(lookup[combination_codes[candidates]].T)
+    rows = candidates[candidate_positions]
+    matched = pd.DataFrame({
+        **{key: raw_data[key].values[rows] for key in keys},
+        'Transition': np.array([rule.name for rule in rules], dtype=object)[rule_positions],
+        'Edit Date': raw_data['Edit Date'].values[rows],
+    })
+
+    #drop rows without a shipping reference number (these come from sales only rows of the outer merge)
+    matched = matched[matched[REF_COL].notna()]
+
+    #keep the last matching row per key and status change, the last matching row wins like the original row scan
+    return matched.groupby(list(keys) + ['Transition'], sort=False).tail(1)
+
+
+#create a function that finds the status change edit dates for every shipping reference number in one pass over the audit trail
+#returns a dataframe indexed by shipping reference number with one timestamp column per status change, references without a given status change hold NaT
+def extract_transitions(raw_data):
+    #find the last matching audit row of every shipping reference number and status change
+    matched = match_transitions(raw_data)
+
+    #turn the status changes into columns, one row per shipping reference number
+    transitions = matched.set_index([REF_COL, 'Transition'])['Edit Date'].unstack('Transition')
+
+    #include every shipping reference number left in the audit trail, even when none of its rows match a status change
+    transitions = transitions.reindex(index=pd.Index(raw_data[REF_COL].dropna().unique(), name=REF_COL), columns=TRANSITION_COLUMNS)
+
+    #keep the status change columns as timestamps even when no reference has a given status change
+    return transitions.apply(pd.to_datetime)
+
+
+#create a function that lists the audit rows where an order goes out of stock (Change 1) or leaves out of stock (Change -1)
+#returns a dataframe with the key columns, the edit date and the change of every such row in audit order
+def out_of_stock_events(raw_data, keys=(REF_COL,)):
+    combination_codes, lookup = compile_transition_matcher(raw_data, OUT_OF_STOCK_RULES)
+    #a row that matches both rules ('Out of stock' to 'Out of stock') does not change anything
+    change = (lookup[:, 0].astype(np.int8) - lookup[:, 1])[combination_codes]
+    rows = np.flatnonzero((change != 0) & raw_data[REF_COL].notna().values)
+    return pd.DataFrame({
+        **{key: raw_data[key].values[rows] for key in keys},
+        'Edit Date': raw_data['Edit Date'].values[rows],
+        'Change': change[rows],
+    })
+
+
+#create a function that pairs every stock-out of every shipping reference number from its out of stock events
+#the events are sorted by reference and edit date once (a stable sort keeps the audit order of equal edit dates), a stock-out starts at the first entry
+#into out of stock after leaving it (or at the first event) and ends at the next exit, exits without an entry and stock-outs that have not ended are not counted
+#returns a dataframe indexed by shipping reference number with the OUT_OF_STOCK_COLUMNS of every reference with at least one stock-out
+#with a business calendar (see sla_calendar.py) the durations only count working time
+def out_of_stock_intervals(events, calendar=None):
+    events = events[events['Edit Date'].notna()].sort_values([REF_COL, 'Edit Date'], kind='mergesort')
+    refs = events[REF_COL]
+    edit_dates = pd.to_datetime(events['Edit Date'])
+    change = events['Change']
+    #the change of the previous event of the same reference, NaN for the first event of every reference
+    previous_change = change.shift().where(refs.eq(refs.shift()))
+    starts = (change == 1) & (previous_change != 1)
+    ends = (change == -1) & (previous_change == 1)
+    #every end pairs with the latest start, which always belongs to the same reference
+    start_dates = edit_dates.where(starts).ffill()
+    durations = (edit_dates - start_dates)[ends]
+    if calendar is not None:
+        working = calendar.working_time(edit_dates[ends].values.view('i8')) - calendar.working_time(start_dates[ends].values.view('i8'))
+        durations = pd.Series(pd.to_timedelta(working), index=durations.index)
+    stock_outs = pd.DataFrame({REF_COL: refs[ends], 'start': start_dates[ends], 'end': edit_dates[ends], 'duration': durations})
+    intervals = stock_outs.groupby(REF_COL, sort=False).agg(
+        out_of_stock_start=('start', 'first'),
+        out_of_stock_end=('end', 'last'),
+        out_of_stock_count=('duration', 'size'),
+        out_of_stock_total=('duration', 'sum'),
+        out_of_stock_longest=('duration', 'max'),
+    )
+    return intervals
+
+
+#create a function that adds the stock-outs of every shipping reference number to its state, references without a stock-out have a count of 0
+def add_out_of_stock_intervals(state, events, calendar=None):
+    intervals = out_of_stock_intervals(events, calendar).reindex(state.index)
+    for column in OUT_OF_STOCK_COLUMNS:
+        state[column] = intervals[column]
+    state['out_of_stock_count'] = state['out_of_stock_count'].fillna(0).astype(np.int64)
+    return state
+
+
+#create a function that builds the state of every shipping reference number: its status change edit dates, its stock-outs and whether the order was cancelled
+#the state only depends on the audit rows of each reference, so the states of references computed from different uploads can be combined
+def extract_reference_state(raw_data):
+    state = add_out_of_stock_intervals(extract_transitions(raw_data), out_of_stock_events(raw_data))
+    #mark the shipping reference numbers with at least one cancelled audit row, one boolean per reference
+    cancelled = (raw_data['Status'] == 'Cancelled').groupby(raw_data[REF_COL], sort=False).any()
+    state['cancelled'] = cancelled.reindex(state.index, fill_value=False).astype(bool).values
+    return state
+
+
+#create a class that holds everything computed from one pair of supply chain and sales reports
+#df_list holds the seven stage dataframes in the order of STAGE_NAMES
+@dataclass
+class SLAResult:
+    #list of the seven stage dataframes
+    df_list: list
+    #dataframe combining the first six stage dataframes
+    order_info: pd.DataFrame
+    #order info without 'Confirmed to Accepted' and 'Accepted to Shipped' rows, used for the 'Order Lifetime' graphs
+    order_info_con_ship: pd.DataFrame
+    #order info without 'Confirmed to Shipped' rows, used for the 'Detailed Order Lifetime' graphs
+    order_info_con_accept_ship: pd.DataFrame
+    #list of the seven stage dataframes grouped by month and days elapsed
+    grouped_df_list: list
+    #list of the descriptive statistics ('Time Elapsed (Days)' describe output) of the seven stage dataframes
+    stats: list
+    #dictionary of shipping reference numbers and their total order time (days)
+    total_times: dict
+    #aggregate cube of the time elapsed per stage, month and dimension value (see build_aggregate_cube)
+    cube: pd.DataFrame = None
+    #quantile sketches of the time elapsed per stage, month and account, only kept with approximate statistics (see sla_sketch.py)
+    sketches: dict = None
+
+
+#create a function that packs the status change edit dates, closed won date and cancelled flag of every shipping reference number into a structured array
+#edit dates are int64 nanoseconds with NAT for missing dates, the records are in the order of the state index
+def transition_record(state, reference_attributes):
+    record = np.empty(len(state), dtype=TRANSITION_RECORD)
+    for name in TRANSITION_COLUMNS + ['out_of_stock_start', 'out_of_stock_end']:
+        record[name] = pd.to_datetime(state[name]).values.view('i8')
+    for name in ['out_of_stock_total', 'out_of_stock_longest']:
+        record[name] = pd.to_timedelta(state[name]).values.view('i8')
+    record['out_of_stock_count'] = state['out_of_stock_count'].values
+    record['closed_won'] = reference_attributes['Closed Won'].reindex(state.index).values.view('i8')
+    record['cancelled'] = state['cancelled'].values
+    return record
+
+
+#create a function that rounds days to one decimal like round(), np.round scales by ten first so values close to half a tenth are rounded with round()
+def round_days(days):
+    rounded = np.round(days, 1)
+    tenths = days * 10
+    halves = np.abs(tenths - np.floor(tenths) - 0.5) < 1e-6
+    rounded[halves] = [round(value, 1) for value in days[halves].tolist()]
+    return rounded
+
+
+#create a function that converts int64 nanosecond durations to days rounded to one decimal
+#the seconds are counted like Timedelta.total_seconds(), which drops the nanoseconds
+def duration_days(nanoseconds):
+    microseconds = nanoseconds // 1000
+    seconds = (microseconds // 1_000_000).astype(float) + (microseconds % 1_000_000) / 1_000_000
+    return round_days(seconds / 86400)
+
+
+#create a function that converts int64 nanosecond durations to days of the SLA clock rounded to one decimal
+#without a business calendar a day is a calendar day, with one it is a working day of the calendar (see sla_calendar.py)
+def clock_days(nanoseconds, calendar=None):
+    if calendar is None:
+        return duration_days(nanoseconds)
+    return round_days(nanoseconds / calendar.day_length)
+
+
+#create a function that computes the time elapsed (days, rounded to one decimal) between two edit dates of every record, and whether both edit dates exist
+#with a business calendar the edit dates are converted to cumulative working time first, so the difference only counts working time
+def elapsed_days(record, start, end, calendar=None):
+    reached = (record[start] != NAT) & (record[end] != NAT)
+    starts, ends = np.where(reached, record[start], 0), np.where(reached, record[end], 0)
+    if calendar is not None:
+        starts, ends = calendar.working_time(starts), calendar.working_time(ends)
+    return clock_days(ends - starts, calendar), reached
+
+
+#create a function that builds a time elapsed column, references that did not reach the stage hold NaN
+#the column stays float when no reference reached the stage, so describe() still returns the numeric summary
+def stage_column(days, reached):
+    return np.where(reached, days, np.nan)
+
+
+#create a function that converts a series of edit dates to the first day of their month, months are kept as timestamps and only formatted for display
+def month_start(dates):
+    return pd.to_datetime(dates).dt.to_period('M').dt.to_timestamp()
+
+
+#create a function that builds a flag column for all keys, keys in the dictionary keep their dictionary value and every other key gets the default value
+#flag columns only hold a few distinct values so they are stored as categoricals
+def flag_series(d, keys, default):
+    keys = pd.Index(keys)
+    values = pd.Series(d, dtype=object).reindex(keys)
+    values[~keys.isin(list(d.keys()))] = default
+    return values.astype('category')
+
+
+#create a function that builds a table of the account, opportunity and sales information of every shipping reference number, indexed by shipping reference number
+#when a shipping reference number has several rows in the merged dataframe the last row wins
+def build_reference_attributes(raw_data):
+    attributes = raw_data.loc[raw_data[REF_COL].notna(), [REF_COL] + list(REFERENCE_ATTRIBUTES)]
+    attributes = attributes.drop_duplicates(subset=REF_COL, keep='last').set_index(REF_COL).rename(columns=REFERENCE_ATTRIBUTES)
+    #keep the closed won dates as timestamps (NaT when the sales report has no closed won date)
+    attributes['Closed Won'] = pd.to_datetime(attributes['Closed Won'], errors='coerce')
+    return attributes
+
+
+#create a function that numbers the opportunities of the audit rows in the order they first appear, audit rows without an opportunity share one number
+#in the position where the first of them appears
+def opportunity_codes(opportunities):
+    codes = pd.factorize(opportunities)[0]
+    missing = codes == -1
+    if missing.any():
+        #the opportunities numbered before the first missing opportunity keep their numbers, the later ones move up by one
+        missing_code = codes[:np.argmax(missing)].max(initial=-1) + 1
+        codes = np.where(codes >= missing_code, codes + 1, codes)
+        codes[missing] = missing_code
+    return codes
+
+
+#create a function that merges the supply chain and sales reports into one dataframe, with one row per audit row
+#the audit rows are grouped by opportunity in the order the opportunities first appear in the supply chain report, the order the merge has always used,
+#so the last row of every shipping reference number stays the same
+def merge_reports(raw_supply_chain_data, raw_sales_data):
+    #rename the sales 'Opportunity' column to "Opportunity Name" to match the supply chain excel, and keep one sales row per opportunity (the last row wins)
+    #only the sales columns used by the stage dataframes are joined
+    sales = raw_sales_data.rename(columns={'Opportunity Name': 'Opportunity'})[SALES_JOIN_COLUMNS].drop_duplicates(subset='Opportunity', keep='last')
+
+    #remove any sales demo account orders before joining, and put the remaining audit rows in opportunity order with one stable sort
+    rows = np.flatnonzero((raw_supply_chain_data['Account Name'] != DEMO_ACCOUNT).values)
+    rows = rows[np.argsort(opportunity_codes(raw_supply_chain_data['Opportunity'])[rows], kind='stable')]
+    #the audit rows are copied once, renaming in place does not copy them again
+    raw_data = raw_supply_chain_data.take(rows)
+    raw_data.reset_index(drop=True, inplace=True)
+    raw_data.rename(columns={'Account Name': 'Account Name_x'}, inplace=True)
+
+    #find the sales row of every audit row (many audit rows to one sales row), -1 when the opportunity is not in the sales report
+    sales_rows = pd.Index(sales['Opportunity']).get_indexer(raw_data['Opportunity'])
+
+    #add the sales columns, audit rows without a sales row get empty sales columns
+    for name in SALES_JOIN_COLUMNS[1:]:
+        raw_data[name] = take(sales[name].values, sales_rows, allow_fill=True)
+
+    return raw_data
+
+
+#create a function that builds the six status change dataframes (one row per shipping reference number) from the merged dataframe
+#the reference state is extracted from the merged dataframe unless it is passed in (incremental processing keeps the states of unchanged references)
+#a business calendar measures every time elapsed on its SLA clock (see sla_calendar.py), without one time elapsed is in calendar days
+#returns the list of dataframes sorted by year and month, and the dictionary of total order times
+def build_stage_tables(raw_data, state=None, calendar=None):
+    #table of the account, opportunity and sales information of every shipping reference number
+    reference_attributes = build_reference_attributes(raw_data)
+
+    #find the status change edit dates of every shipping reference number in one pass over the merged dataframe
+    if state is None:
+        state = extract_reference_state(raw_data)
+
+    #the stored stock-outs are measured in calendar time, measure them again on the SLA clock without changing the passed state
+    if calendar is not None:
+        state = add_out_of_stock_intervals(state.copy(), out_of_stock_events(raw_data), calendar)
+
+    return stage_tables_from_state(state, reference_attributes, calendar)
+
+
+#create a function that builds the six status change dataframes from the state and the account, opportunity and sales information of every shipping reference number
+#returns the list of dataframes sorted by year and month, and the dictionary of total order times
+#the stock-outs of the state must already be measured with the business calendar when one is passed
+def stage_tables_from_state(state, reference_attributes, calendar=None):
+    #pack the status change edit dates and closed won date of every shipping reference number into one record per reference
+    record = transition_record(state, reference_attributes)
+
+    #compute the time elapsed (days) of every status change for every reference at once, each stage is reached when both of its edit dates exist
+    elapsed = {stage: elapsed_days(record, start, end, calendar) for stage, (start, end, date) in STAGE_TRANSITIONS.items()}
+    #an order is out of stock when it has at least one stock-out, its time elapsed is the total of its stock-outs
+    out_of_stock = record['out_of_stock_count'] > 0
+    elapsed['Out of Stock'] = (clock_days(np.where(out_of_stock, record['out_of_stock_total'], 0), calendar), out_of_stock)
+
+    #orders that were accepted but never shipped
+    not_shipped = (record['accepted'] != NAT) & (record['shipped'] == NAT)
+
+    #keep the shipping reference numbers that reached a stage, were not shipped or were cancelled, sorted by shipping reference number
+    keep = not_shipped | record['cancelled']
+    for days, reached in elapsed.values():
+        keep |= reached
+    positions = np.flatnonzero(keep)
+    positions = positions[np.argsort(state.index.values[positions], kind='stable')]
+    all_keys = pd.Index(state.index.values[positions], name='Shipping Reference Number')
+    record = record[positions]
+    elapsed = {stage: (days[positions], reached[positions]) for stage, (days, reached) in elapsed.items()}
+    not_shipped = not_shipped[positions]
+
+    #the total time adds up the time from closed won to shipped (closed won to created, created to confirmed, confirmed to accepted and accepted to shipped)
+    total_time = np.zeros(len(record))
+    for stage in TOTAL_TIME_STAGES:
+        days, reached = elapsed[stage]
+        total_time = total_time + np.where(reached, days, 0)
+    total_time = round_days(total_time)
+    #create a total_times dictionary that will store the total amount of time it took for an opportunity to enter closed_won to be shopped to the customer
+    total_times = dict(zip(all_keys, total_time.tolist()))
+
+    #line the reference attributes up with the shipping reference numbers of the dataframes
+    attributes = reference_attributes.reindex(all_keys)
+
+    #the attribute, flag and total time columns are the same for every status change dataframe, build them once with their default values filled in
+    #the columns are kept as arrays lined up with all_keys, so the dataframes do not have to align their indexes
+    shared_columns = {
+        'Account Name': attributes['Account Name'].array,
+        'Opportunity Name': attributes['Opportunity Name'].array,
+        'Opportunity Type': flag_series(reference_attributes['Opportunity Type'], all_keys, FLAG_DEFAULTS['Opportunity Type']).array,
+        'Asset Type': flag_series(reference_attributes['Asset Type'], all_keys, FLAG_DEFAULTS['Asset Type']).array,
+        'Closed Won': attributes['Closed Won'].array,
+        'Order Out of Stock': flag_series(pd.Series('Out of Stock', index=all_keys[elapsed['Out of Stock'][1]]), all_keys, FLAG_DEFAULTS['Order Out of Stock']).array,
+        'Order Shipped': flag_series(pd.Series('Not Shipped', index=all_keys[not_shipped]), all_keys, FLAG_DEFAULTS['Order Shipped']).array,
+        'Cancelled Order': flag_series(pd.Series('Cancelled', index=all_keys[record['cancelled']]), all_keys, FLAG_DEFAULTS['Cancelled Order']).array,
+        'Total Time (Days)': total_time,
+    }
+
+    #build one dataframe per status change in the order of STAGE_TRANSITIONS, references that did not reach the stage have no status change, time elapsed or date
+    df_list = []
+    for stage, (start, end, date) in STAGE_TRANSITIONS.items():
+        days, reached = elapsed[stage]
+        df = pd.DataFrame({
+            'Order Status Change': np.where(reached, stage, None),
+            'Time Elapsed (Days)': stage_column(days, reached),
+            'Account Name': shared_columns['Account Name'],
+            'Opportunity Name': shared_columns['Opportunity Name'],
+            'Opportunity Type': shared_columns['Opportunity Type'],
+            'Asset Type': shared_columns['Asset Type'],
+            'Closed Won': shared_columns['Closed Won'],
+            'Order Out of Stock': shared_columns['Order Out of Stock'],
+            'Order Shipped': shared_columns['Order Shipped'],
+            'Cancelled Order': shared_columns['Cancelled Order'],
+            'Date' : month_start(pd.Series(np.where(reached, record[date], NAT).view('datetime64[ns]'))).array,
+            'Total Time (Days)': shared_columns['Total Time (Days)']
+        }, index=all_keys)
+
+        #the out of stock dataframe also holds the number of stock-outs and the longest stock-out of every order
+        if stage == 'Out of Stock':
+            df['Out of Stock Count'] = record['out_of_stock_count']
+            df['Longest Out of Stock (Days)'] = np.where(reached, clock_days(np.where(reached, record['out_of_stock_longest'], 0), calendar), np.nan)
+
+        #reset the index so the shipping reference number is a column
+        df.reset_index(inplace = True)
+
+
+        #pull the year and month numbers from the date for sorting, orders without a date get year and month 0
+        df['Year'] = df['Date'].dt.year.fillna(0).astype(int)
+        df['Month'] = df['Date'].dt.month.fillna(0).astype(int)
+
+        #sort DataFrame by 'Year' and 'Month'
+        df_list.append(df.sort_values(by=['Year', 'Month']))
+
+    return df_list, total_times
+
+
+#create a function that combines the status change dataframes into the order info dataframes and adds the total order time dataframe to the df_list
+def build_order_info(df_list):
+    #limit out of order dataframe to only include out of stock orders, most orders are in stock and this skews results
+    df_list[5] = df_list[5][(df_list[5]['Order Out of Stock'] == 'Out of Stock')].copy()
+
+    #create main order info dataframe that holds all info from all dataframes in our df_list, the stock-out details only belong to the out of stock dataframe
+    order_info = pd.concat(df_list[:5] + [df_list[5].drop(columns=OUT_OF_STOCK_DETAIL_COLUMNS)], ignore_index=True)
+    #sort order info dataframe by year and month
+    order_info = order_info.sort_values(by=['Year', 'Month'])
+    
+    #drop year and month columns from order info and all other dataframes in df_list
+    order_info.drop(columns=['Year', 'Month'], inplace=True)
+    for df in df_list:
+        df = df.drop(columns=['Year', 'Month'], inplace=True)
+
+    #create a total_time_order_info dataframe that includes information about the total lifetime of the orders, use the confirm_order_info dataframe as a base as all orders with shipping reference numbers are confirmed (largest volume of data)
+    total_time_order_info = df_list[1].drop(columns = ['Order Status Change','Time Elapsed (Days)'])
+    #rename the 'Total Time (Days)' column to 'Time Elapsed (Days)' so this dataframe is consistent with the format of the other dataframes
+    total_time_order_info.rename(columns = {'Total Time (Days)': 'Time Elapsed (Days)'}, inplace = True)
+    #add this total time dataframe to our dataframe list
+    df_list.append(total_time_order_info)
+
+    #create a dataframe of order information for the 'Order Lifetime' visualization, excludes order information related to 'Confirmed to Accepted' and 'Accepted to Shipped' (double counting days)
+    order_info_con_ship = order_info[
+    ~((order_info['Order Status Change'] == 'Confirmed to Accepted') | 
+      (order_info['Order Status Change'] == 'Accepted to Shipped'))].copy()
+
+    #create a dataframe of order information for 'Detailed Order Lifetime' visualization, excludes order information related to 'Confirmed to Shipped' (double counting days)
+    order_info_con_accept_ship  = order_info[
+    ~((order_info['Order Status Change'] == 'Confirmed to Shipped'))].copy()
+
+    return order_info, order_info_con_ship, order_info_con_accept_ship
+
+
+#maximum number of shipping reference numbers listed in the hover text of one scatterplot point, larger groups are too large to display
+MAX_HOVER_REFERENCES = 31
+
+
+#create a function that groups a stage dataframe by month and days elapsed (rounded to the nearest day)
+#returns one row per month and day count with the order count and the shipping reference numbers/accounts used as hover text
+def group_stage_by_day(df):
+    #round the time elapsed to the nearest day and drop rows without a date or time elapsed
+    rounded_df = df[['Shipping Reference Number', 'Account Name', 'Date', 'Time Elapsed (Days)']].round()
+    rounded_df = rounded_df.dropna(subset=['Date', 'Time Elapsed (Days)'])
+
+    #group the rows by month and days elapsed, rows keep their dataframe order inside each group
+    groups = rounded_df.groupby(['Date', 'Time Elapsed (Days)'], sort=False)
+
+    #label each shipping reference number/account in the form Shipping Ref 1: Shipping Ref Number: Account Name
+    ref_position = (groups.cumcount() + 1).astype(str)
+    ref_labels = 'Shipping Ref ' + ref_position + ': ' + rounded_df['Shipping Reference Number'].astype(str) + ': ' + rounded_df['Account Name'].astype(str)
+
+    #count the orders in each group and join the labels with a break for formatting
+    grouped_df = pd.DataFrame({
+        'Order Count': groups.size(),
+        'Shipping Details': ref_labels.groupby([rounded_df['Date'], rounded_df['Time Elapsed (Days)']], sort=False).agg('<br>'.join),
+    }).reset_index()
+
+    #if a group has more than 31 associated shipping reference accounts/numbers the hover text becomes too large to display, use alternative text
+    grouped_df.loc[grouped_df['Order Count'] > MAX_HOVER_REFERENCES, 'Shipping Details'] = 'Too many references to display'
+
+    #cast the days into integers
+    grouped_df['Time Elapsed (Days)'] = grouped_df['Time Elapsed (Days)'].fillna(0).astype(int)
+
+    return grouped_df[['Time Elapsed (Days)', 'Order Count', 'Date', 'Shipping Details']]
+
+
+#create a function that groups each stage dataframe by month and days elapsed, these grouped dataframes are used for the days elapsed scatterplots
+def group_days_elapsed(df_list):
+    #create a list to store the grouped dataframes
+    grouped_df_list = []
+
+    for df in df_list:
+        grouped_df = group_stage_by_day(df)
+
+        #sort dataframe by month and days elapsed
+        grouped_df = grouped_df.sort_values(by=['Date', 'Time Elapsed (Days)'], kind='mergesort', ignore_index=True)
+
+        #add the final grouped dataframe to the list of grouped dataframes
+        grouped_df_list.append(grouped_df)
+
+    return grouped_df_list
+
+
+#create a function that pulls the descriptive statistics (count, mean, std. dev., min, quartiles, max) of the time elapsed in each stage dataframe
+def describe_stages(df_list):
+    return [df['Time Elapsed (Days)'].describe() for df in df_list]
+
+
+#create a function that builds the aggregate cube of the time elapsed, with the count, mean, standard deviation and quantiles of every stage, month and dimension value
+#the cube is indexed by (Stage, Month, Dimension, Value), stages are STAGE_NAMES and months are 'YYYY-MM' text
+#rows with Month ALL cover every month and rows with Dimension and Value ALL cover every order, so every breakdown is a lookup instead of a new computation
+def build_aggregate_cube(df_list):
+    #stack the time elapsed of every stage with its month and dimension values, missing dimension values are grouped as 'N/A'
+    frames = []
+    for stage_name, df in zip(STAGE_NAMES, df_list):
+        df = df[df['Time Elapsed (Days)'].notna()]
+        frames.append(pd.DataFrame({
+            'Stage': stage_name,
+            'Month': df['Date'],
+            **{dimension: df[dimension].astype(object).fillna('N/A') for dimension in CUBE_DIMENSIONS},
+            'Days': df['Time Elapsed (Days)'],
+        }))
+    days = pd.concat(frames, ignore_index=True)
+    #each month is written as text once, and the keys are grouped as categories so they are only factorized once
+    days['Month'] = days['Month'].map({month: month.strftime('%Y-%m') for month in pd.DatetimeIndex(days['Month'].dropna().unique())})
+    keys = ['Stage', 'Month'] + CUBE_DIMENSIONS
+    days[keys] = days[keys].astype('category')
+    every = pd.Series(ALL, index=days.index, dtype='category')
+
+    #aggregate every stage by month and by every month together, each time for every order together and for every dimension value
+    cells = []
+    for month in [days['Month'], every]:
+        for dimension in [ALL] + CUBE_DIMENSIONS:
+            values = every if dimension == ALL else days[dimension]
+            grouped = days['Days'].groupby([days['Stage'], month.rename('Month'), values.rename('Value')], sort=False, observed=True)
+            aggregates = grouped.agg(['count', 'mean', 'std'])
+            #an upload without stage durations has no quantile columns to unstack, reindex so the cube keeps every column
+            quantiles = grouped.quantile(list(CUBE_QUANTILES.values())).unstack().reindex(columns=list(CUBE_QUANTILES.values()))
+            quantiles.columns = list(CUBE_QUANTILES)
+            cells.append(pd.concat([aggregates, quantiles], axis=1).assign(Dimension=dimension))
+    cube = pd.concat(cells).set_index('Dimension', append=True).reorder_levels(['Stage', 'Month', 'Dimension', 'Value'])
+    cube['count'] = cube['count'].astype(int)
+    #a sorted index answers lookups with a binary search
+    return cube.sort_index()
+
+
+#create a function that looks up the aggregate cube rows of a stage and month broken down by a dimension, indexed by the dimension values
+def cube_cells(cube, stage_name, month=ALL, dimension=ALL):
+    return cube.loc[(stage_name, month, dimension)]
+
+
+#create a function that computes the order info, grouped dataframes and statistics from the status change dataframes
+def summarize_stage_tables(df_list, total_times):
+    #build the order info dataframes, this also adds the total order time dataframe to df_list
+    with span('order info') as record:
+        order_info, order_info_con_ship, order_info_con_accept_ship = build_order_info(df_list)
+        record['rows'] = len(order_info)
+    #group the stage dataframes by month and days elapsed
+    with span('monthly grouping') as record:
+        grouped_df_list = group_days_elapsed(df_list)
+        record['rows'] = sum(len(df) for df in grouped_df_list)
+    #describe the time elapsed in each stage
+    with span('statistics') as record:
+        stats = describe_stages(df_list)
+        record['rows'] = sum(len(df) for df in df_list)
+    #aggregate the time elapsed in each stage by month and dimension once, breakdowns are looked up in the cube afterwards
+    with span('aggregate cube') as record:
+        cube = build_aggregate_cube(df_list)
+        record['rows'] = len(cube)
+
+    return SLAResult(
+        df_list=df_list,
+        order_info=order_info,
+        order_info_con_ship=order_info_con_ship,
+        order_info_con_accept_ship=order_info_con_accept_ship,
+        grouped_df_list=grouped_df_list,
+        stats=stats,
+        total_times=total_times,
+        cube=cube,
+    )
+
+
+#create a function that computes every SLA dataframe and statistic from the supply chain and sales reports, no streamlit or plotly is needed
+#when a reference state store is passed only the new and changed shipping reference numbers are extracted from the audit trail
+#a business calendar (see sla_calendar.py) measures the time elapsed in working days or business hours instead of calendar days
+def compute_sla_frames(raw_supply_chain_data, raw_sales_data, state_store=None, calendar=None):
+    #merge the reports and remove sales demo accounts
+    with span('merge') as record:
+        raw_data = merge_reports(raw_supply_chain_data, raw_sales_data)
+        record['rows'] = len(raw_data)
+    #find the status change edit dates of every shipping reference number, or update the stored reference states with the merged dataframe
+    with span('transitions') as record:
+        state = state_store.update(raw_data) if state_store is not None else extract_reference_state(raw_data)
+        record['rows'] = len(raw_data)
+    #build the status change dataframes
+    with span('stage tables') as record:
+        df_list, total_times = build_stage_tables(raw_data, state, calendar)
+        record['rows'] = len(total_times)
+    #build the order info, grouped dataframes and statistics
+    return summarize_stage_tables(df_list, total_times)
@@ -0,0 +1,278 @@
+#functions that build the plotly graphs and the statistics text of the application from the computed SLA dataframes, no streamlit is needed
+
+#import necessary packages
+import pandas as pd
+import plotly.express as px
+from sla_engine import ALL, STAGE_NAMES, cube_cells
+
+
+#create a function that writes the dates of a column as text, only the distinct dates are formatted
+def format_dates(dates, date_format, missing):
+    labels = {date: date.strftime(date_format) for date in pd.DatetimeIndex(dates.dropna().unique())}
+    return dates.map(labels).where(dates.notna(), missing)
+
+
+#create a function that returns a copy of a dataframe with its dates written as text for the graph legends and hover text
+#the engine keeps dates as timestamps, months are displayed as 'Year: Month' and closed won dates as 'Year-Month-Day Hours:Minutes:Seconds'
+def format_for_display(df):
+    df = df.copy()
+    df['Date'] = format_dates(df['Date'], '%Y: %B', None)
+    if 'Closed Won' in df.columns:
+        df['Closed Won'] = format_dates(df['Closed Won'], '%Y-%m-%d %H:%M:%S', 'None')
+    return df
+
+
+#figure modes, full figures send every column to the browser for the hover text, lightweight figures only send the key columns,
+#sum the histogram bars before sending them and draw large scatterplots with WebGL, automatic picks lightweight figures for large reports
+FIGURE_MODES = ['Automatic', 'Full', 'Lightweight']
+
+#number of order lifetime rows above which the automatic mode uses lightweight figures
+LIGHTWEIGHT_ROW_THRESHOLD = 5000
+
+#number of points above which lightweight scatterplots are drawn with WebGL instead of SVG
+WEBGL_ROW_THRESHOLD = 1000
+
+#columns shown in the hover text of lightweight figures, the axis and legend columns are always shown
+LIGHTWEIGHT_HOVER_COLUMNS = ['Date', 'Account Name', 'Opportunity Name']
+
+
+#create a function that picks the figure mode used for a report
+def resolve_figure_mode(figure_mode, result):
+    if figure_mode == 'Automatic':
+        return 'Lightweight' if len(result.order_info) > LIGHTWEIGHT_ROW_THRESHOLD else 'Full'
+    return figure_mode
+
+
+#create a function that returns the columns shown in the hover text of a figure
+def hover_columns(df, color, figure_mode):
+    if figure_mode == 'Full':
+        return df.columns
+    return [name for name in LIGHTWEIGHT_HOVER_COLUMNS if name in df.columns and name != color]
+
+
+#create a function that draws the time elapsed of every shipping reference number as bars
+#full figures let plotly sum the bars in the browser and add a rug of every row, lightweight figures sum the bars here and leave out the rug
+def time_elapsed_histogram(df, color, figure_mode, **kwargs):
+    hover_data = hover_columns(df, color, figure_mode)
+    if figure_mode == 'Full':
+        return px.histogram(df, x= "Shipping Reference Number", y="Time Elapsed (Days)", color = color, marginal="rug", hover_data= hover_data, **kwargs)
+    #one bar per color and shipping reference number holding the summed time elapsed, like the histogram bins
+    bars = df.groupby([color, 'Shipping Reference Number'], sort=False).agg(
+        {'Time Elapsed (Days)': 'sum', **{name: 'first' for name in hover_data}}).reset_index()
+    return px.bar(bars, x= "Shipping Reference Number", y="Time Elapsed (Days)", color = color, hover_data= hover_data, **kwargs)
+
+
+#create a function that draws a boxplot of the time elapsed
+def time_elapsed_box(df, color, figure_mode, **kwargs):
+    return px.box(df, x= "Time Elapsed (Days)", color = color, hover_data= hover_columns(df, color, figure_mode), **kwargs)
+
+
+#create a function that draws the number of orders per days elapsed, large lightweight scatterplots are drawn with WebGL
+def days_elapsed_scatter(df, figure_mode):
+    if figure_mode == 'Full':
+        return px.scatter(df, x = 'Time Elapsed (Days)', y = 'Order Count', color = 'Date', hover_name = 'Shipping Details')
+    render_mode = 'webgl' if len(df) > WEBGL_ROW_THRESHOLD else 'svg'
+    return px.scatter(df, x = 'Time Elapsed (Days)', y = 'Order Count', color = 'Date', hover_name = 'Shipping Details', render_mode = render_mode)
+
+
+#create a function that measures the size of the JSON sent to the browser for each graph
+def figure_payload_sizes(figures):
+    return pd.DataFrame({
+        'Graph': list(figures),
+        'Payload (KB)': [round(len(figure.to_json()) / 1024, 1) for figure in figures.values()],
+    })
+
+
+#custom colors assigned for Order Lifetime Graphs (want graphs/processes to be color matched)
+custom_colors = {
+    'Closed Won to Created': '#636efa',
+    'Created to Confirmed': '#00cc96',
+    'Confirmed to Accepted': '#FFA15A',
+    'Accepted to Shipped': '#19d3f3',
+    'Confirmed to Shipped': '#ab63fa',
+    'Out of Stock': '#FF6692'
+}
+
+#create a list of titles for the histograms and boxplots, the first seven titles match the stage dataframes (in the order of STAGE_NAMES) and the last two match the order lifetime dataframes
+title_list = ['Time Elapsed Closed Won to Created', 'Time Elapsed Created to Confirmed', 'Time Elapsed Confirmed to Accepted', 'Time Elapsed Accepted to Shipped', 'Time Elapsed Confirmed to Shipped', 'Time Elapsed Out of Stock', 'Total Order Time', 'Order Lifetime', 'Detailed Order Lifetime']
+
+#create list of scatterplot titles
+new_title_list = ['Days From Closed Won to Created', 'Days From Created to Confirmed', 'Days From Confirmed to Accepted', 'Days From Accepted to Shipped', 'Days From Confirmed to Shipped', 'Days Out of Stock',
+              'Total Order Time']
+
+#create a list describing whats happening with the shipping reference numbers
+ship_ref_action_list = ['Shipping Reference Numbers Created', 'Shipping Reference Numbers Confirmed', 'Shipping Reference Numbers Accepted', 'Shipping Reference Numbers Shipped', 'Shipping Reference Numbers Shipped', 'Out of Stock Shipping Reference Numbers', 'Shipping Reference Numbers Completed']
+
+#sections of the page in display order, only the graphs of the selected section are built
+section_list = [title_list[7], title_list[8], title_list[6]] + title_list[:6]
+
+
+#create a function that formats a histogram, adds the title and assigns a graph height
+def format_histogram(fig, title, height):
+    fig.update_layout(
+        title={
+            'text': f'{title}<br><sup>Hover over top bar for additional order information</sup>', #assign title
+            'x': 0.5,  #center title
+            'xanchor': 'center',  #center title
+            'yanchor': 'top',  #anchor title to the top
+            'font': {'size': 20},  #main title font size
+        },
+        title_font_size=24,  #main title font size
+        title_font_color="black",  #main title font color
+        yaxis_title='Time Elapsed (Days)',  #customize the y-axis title
+        font=dict(
+            size=12,  #global font size
+            color="black"  #global font color
+        ),
+        #width=1200,
+        height=height, #size the graph
+    )
+    return fig
+
+
+#create a function that formats a boxplot and adds the title
+def format_boxplot(fig, title):
+    fig.update_layout(
+        title={
+            'text': f'{title}<br><sup>Hover over points for additional order information</sup>', #assign title
+            'x': 0.5,  #center title
+            'xanchor': 'center',  #center title
+            'yanchor': 'top',  #anchor title to the top
+            'font': {'size': 24, 'color': 'black'},  # title font size and color
+        },
+        xaxis_title='Time Elapsed (Days)',  #customize the x-axis title
+        font=dict(
+            size=12,  #global font size
+            color="black"  #global font color
+        ),
+        #width=1200,
+        height=600, #size the graph
+    )
+    return fig
+
+
+#create a function that formats a scatterplot and adds the title
+def format_scatterplot(fig, title):
+    fig.update_layout(
+        title={
+            'text': f'{title}<br><sup>Hover over top bar for additional order information</sup>', #add a title
+            'x': 0.5,  #center title
+            'xanchor': 'center',  #center title
+            'yanchor': 'top',  #anchor title to the top
+            'font': {'size': 20},  #main title font size
+        },
+        title_font_size=24,  #main title font size
+        title_font_color="black",  #main title font color
+        font=dict(
+            size=12,  #global font size
+            color="black"  #global font color
+        ),
+        height=600,
+    )
+    #make the scatterplot point size = 12 for legibility
+    fig.update_traces(marker=dict(size = 12))
+    return fig
+
+
+#create a function that builds the histogram and boxplot of the 'Order Lifetime' or 'Detailed Order Lifetime' section
+def build_lifetime_figures(order_info, title, figure_mode):
+    #format the dates of the order info dataframe for display
+    order_info = format_for_display(order_info)
+    #create the histogram colored by order status change, the lifetime histograms are taller than the stage histograms
+    hist = format_histogram(time_elapsed_histogram(order_info, "Order Status Change", figure_mode, color_discrete_map = custom_colors), title, 900)
+    #create the boxplot colored by order status change
+    box = format_boxplot(time_elapsed_box(order_info, "Order Status Change", figure_mode, color_discrete_map = custom_colors), title)
+    return {f'{title} Histogram': hist, f'{title} Boxplot': box}
+
+
+#create a function that builds the histogram, scatterplot and boxplot of a stage section
+def build_stage_figures(result, i, figure_mode):
+    #format the dates of the stage dataframe and its grouped dataframe for display
+    df = format_for_display(result.df_list[i])
+    grouped_df = format_for_display(result.grouped_df_list[i])
+    #create the histogram with shipping reference number as the x-axis and time elapsed as the y-axis, colored by month
+    hist = format_histogram(time_elapsed_histogram(df, 'Date', figure_mode), title_list[i], 700)
+    #create the scatterplot of the number of orders per days elapsed
+    day_fig = format_scatterplot(days_elapsed_scatter(grouped_df, figure_mode), new_title_list[i])
+    #create the boxplot with time elapsed as the x-axis, colored by month
+    box = format_boxplot(time_elapsed_box(df, 'Date', figure_mode), title_list[i])
+    return {f'{title_list[i]} Histogram': hist, f'{new_title_list[i]} Scatterplot': day_fig, f'{title_list[i]} Boxplot': box}
+
+
+#create a function that returns the dataframes the graphs of a section are built from, as positions in df_list or names of the order info dataframes
+def section_frames(section):
+    if section == title_list[7]:
+        return ['order_info_con_ship']
+    if section == title_list[8]:
+        return ['order_info_con_accept_ship']
+    return [title_list.index(section)]
+
+
+#create a function that builds the graphs of one section of the page
+def build_section_figures(result, section, figure_mode):
+    if section == title_list[7]:
+        #'Order Lifetime' excludes confirmed to accepted and accepted to shipped
+        return build_lifetime_figures(result.order_info_con_ship, section, figure_mode)
+    if section == title_list[8]:
+        #'Detailed Order Lifetime' excludes confirmed to shipped
+        return build_lifetime_figures(result.order_info_con_accept_ship, section, figure_mode)
+    return build_stage_figures(result, title_list.index(section), figure_mode)
+
+
+#create a function that writes the statistics of each stage dataframe, include mean, median, std. dev. count, ect.
+def build_statistics_text(result):
+    output_list = []
+    #iterate through the statistics of the stage dataframes
+    for i in range(len(result.stats)):
+        descriptive_stats = result.stats[i]
+        text = f'''
+                    Number of {ship_ref_action_list[i]}: {round(descriptive_stats[0], 0).astype(int)}
+
+                    Average Number of Days from {title_list[i][12:]}: {round(descriptive_stats[1], 1)}
+
+                    Minimum Number of Days from {title_list[i][12:]}: {round(descriptive_stats[3], 1)}
+
+                    First Quartile Number of Days from {title_list[i][12:]}: {round(descriptive_stats[4], 1)}
+
+                    Median Number of Days from {title_list[i][12:]}: {round(descriptive_stats[5], 1)}
+
+                    Third Quartile Number of Days from {title_list[i][12:]}: {round(descriptive_stats[6], 1)}
+
+                    Maximum Number of Days from {title_list[i][12:]}: {round(descriptive_stats[7], 1)}
+
+                    Standard Deviation (Days) from {title_list[i][12:]}: {round(descriptive_stats[2], 1)}
+            '''
+        output_list.append(text)
+    return output_list
+
+
+#create a function that builds a table of the statistics of every stage, shown before any graph is built
+def build_statistics_table(result):
+    table = pd.DataFrame(result.stats, index=title_list[:len(result.stats)]).round(1)
+    table.columns = ['Count', 'Mean', 'Std. Dev.', 'Min', 'First Quartile', 'Median', 'Third Quartile', 'Max']
+    table['Count'] = table['Count'].astype(int)
+    return table
+
+
+#create a function that writes an aggregate cube month ('YYYY-MM') the way the graphs write months
+def month_label(month):
+    return month if month == ALL else pd.Timestamp(month).strftime('%Y: %B')
+
+
+#create a function that lists the months of the aggregate cube, ALL first
+def cube_months(result):
+    months = result.cube.index.get_level_values('Month').unique()
+    return [ALL] + sorted(month for month in months if month != ALL)
+
+
+#create a function that builds a table of the statistics of a stage and month broken down by a dimension, looked up in the aggregate cube
+def build_breakdown_table(result, i, month, dimension):
+    columns = ['Count', 'Mean', 'Std. Dev.', 'Median', '90th Percentile', '95th Percentile', '99th Percentile']
+    key = (STAGE_NAMES[i], month, dimension)
+    #a stage can have no orders in a month
+    if key not in result.cube.index:
+        return pd.DataFrame(columns=columns)
+    table = cube_cells(result.cube, *key)[['count', 'mean', 'std', 'p50', 'p90', 'p95', 'p99']].round(1)
+    table.columns = columns
+    table.index.name = dimension
+    return table
@@ -0,0 +1,90 @@
+#import necessary packages
+import numpy as np
+import pandas as pd
+from sla_engine import CUBE_DIMENSIONS, SLAResult, group_days_elapsed
+
+
+#columns the page can be filtered by, the month filter uses the 'Date' column of every dataframe
+FILTER_DIMENSIONS = CUBE_DIMENSIONS + ['Month']
+
+#names of the order info dataframes of SLAResult, the stage dataframes are keyed by their position in df_list
+ORDER_INFO_FRAMES = ['order_info', 'order_info_con_ship', 'order_info_con_accept_ship']
+
+
+#create a class that indexes the filter columns of every dataframe of a computed SLA result once
+#each column is stored as integer codes into the sorted values of its dimension, so a filter is a lookup table indexed by the codes instead of a comparison of every row
+class FilterIndex:
+
+    def __init__(self, result):
+        frames = dict(enumerate(result.df_list))
+        frames.update({name: getattr(result, name) for name in ORDER_INFO_FRAMES})
+        #values of every dimension, missing values are grouped as 'N/A' like in the aggregate cube, rows without a month only pass when no month is selected
+        self.values = {}
+        #codes of every dataframe and dimension, -1 marks rows without a value
+        self.codes = {key: {} for key in frames}
+        for dimension in FILTER_DIMENSIONS:
+            if dimension == 'Month':
+                columns = {key: df['Date'] for key, df in frames.items()}
+            else:
+                columns = {key: df[dimension].astype(object).fillna('N/A') for key, df in frames.items()}
+            values = pd.Index(pd.concat(columns.values(), ignore_index=True).dropna().unique()).sort_values()
+            self.values[dimension] = list(values)
+            for key, column in columns.items():
+                self.codes[key][dimension] = values.get_indexer(column)
+
+    #create a boolean mask of the rows of a dataframe that match the selected values of every dimension, None when nothing is selected
+    #selections maps dimensions to lists of selected values, a row matches when it has one of the selected values of every dimension with a selection
+    def mask(self, key, selections):
+        mask = None
+        for dimension, selected in selections.items():
+            if not selected:
+                continue
+            #lookup table of the selected codes, the extra last entry is used by the -1 code of rows without a value
+            allowed = np.zeros(len(self.values[dimension]) + 1, dtype=bool)
+            allowed[pd.Index(self.values[dimension]).get_indexer(selected)] = True
+            allowed[-1] = False
+            matches = allowed[self.codes[key][dimension]]
+            mask = matches if mask is None else mask & matches
+        return mask
+
+
+#create a function that describes the time elapsed of the rows of a stage dataframe that match the filters
+def describe_filtered(df, mask):
+    days = df['Time Elapsed (Days)']
+    return (days if mask is None else days[mask]).describe()
+
+
+#create a function that applies filters to a computed SLA result
+#only the dataframes listed in keys (stage positions or ORDER_INFO_FRAMES names) are filtered, the other dataframes and grouped dataframes are None
+#the statistics of every stage are always filtered, they only need the time elapsed column
+def filter_result(result, filter_index, selections, keys):
+    masks = {key: filter_index.mask(key, selections) for key in filter_index.codes}
+    df_list = [None] * len(result.df_list)
+    grouped_df_list = [None] * len(result.df_list)
+    frames = {}
+    for key in keys:
+        df = getattr(result, key) if key in ORDER_INFO_FRAMES else result.df_list[key]
+        filtered = df if masks[key] is None else df[masks[key]]
+        if key in ORDER_INFO_FRAMES:
+            frames[key] = filtered
+        else:
+            #group the filtered stage by month and days elapsed for its scatterplot
+            df_list[key] = filtered
+            grouped_df_list[key] = group_days_elapsed([filtered])[0]
+    total_time_mask = masks[len(result.df_list) - 1]
+    total_time_refs = result.df_list[-1]['Shipping Reference Number']
+    return SLAResult(
+        df_list=df_list,
+        order_info=frames.get('order_info'),
+        order_info_con_ship=frames.get('order_info_con_ship'),
+        order_info_con_accept_ship=frames.get('order_info_con_accept_ship'),
+        grouped_df_list=grouped_df_list,
+        stats=[describe_filtered(df, masks[i]) for i, df in enumerate(result.df_list)],
+        total_times={ref: result.total_times[ref] for ref in (total_time_refs if total_time_mask is None else total_time_refs[total_time_mask])},
+    )
+
+
+#create a function that counts the shipping reference numbers that match the filters, from the total order time dataframe which has a row for every reference
+def count_references(result, filter_index, selections):
+    mask = filter_index.mask(len(result.df_list) - 1, selections)
+    return len(result.df_list[-1]) if mask is None else int(mask.sum())
@@ -0,0 +1,185 @@
+#import necessary packages
+import hashlib
+import io
+import os
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from sla_cache import content_hash, upload_cache
+from sla_profile import span
+
+
+#columns read from the supply chain report and the dtype each column is stored as, every other column in the workbook is skipped
+SUPPLY_CHAIN_COLUMNS = {
+    'Shipping Details: Ref No.': 'object',
+    'Opportunity': 'object',
+    'Account Name': 'object',
+    'Field / Event': 'object',
+    'Old Value': 'object',
+    'New Value': 'object',
+    'Edit Date': 'datetime64[ns]',
+    'Status': 'object',
+}
+
+#columns read from the sales report and the dtype each column is stored as
+SALES_COLUMNS = {
+    'Opportunity Name': 'object',
+    'Account Name': 'object',
+    'Closed won date': 'datetime64[ns]',
+    'Opportunity Type': 'object',
+    'Asset Type': 'object',
+}
+
+#folder where parsed uploads are saved as feather files, can be moved with the SLA_SIDECAR_DIR environment variable
+SIDECAR_DIR = os.environ.get('SLA_SIDECAR_DIR', '.sla_cache')
+
+
+#create a function that reads the first worksheet of an Excel workbook row by row in read-only mode, only keeping the requested columns
+#yields dataframes of at most chunk_rows rows (one dataframe with every row when chunk_rows is None), at least one dataframe is always yielded
+def iter_excel_chunks(source, columns, chunk_rows):
+    #read-only mode streams the worksheet instead of loading every cell into memory
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        #the first row holds the column names
+        header = next(rows, ())
+        #find the position of each requested column that exists in the workbook
+        positions = [(position, name) for position, name in enumerate(header) if name in columns]
+        names = [name for position, name in positions]
+        #collect the requested values from every row, skipping empty rows
+        records = []
+        chunk_count = 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            records.append([row[position] if position < len(row) else None for position, name in positions])
+            if len(records) == chunk_rows:
+                yield pd.DataFrame(records, columns=names)
+                chunk_count += 1
+                records = []
+        if records or chunk_count == 0:
+            yield pd.DataFrame(records, columns=names)
+    finally:
+        workbook.close()
+
+
+#create a function that reads the first worksheet of an Excel workbook into one dataframe, only keeping the requested columns
+def read_excel_columns(source, columns):
+    chunks = iter_excel_chunks(source, columns, None)
+    try:
+        return next(chunks)
+    finally:
+        #close the workbook
+        chunks.close()
+
+
+#create a function that reads a CSV file, only keeping the requested columns
+#returns one dataframe, or an iterator of dataframes of at most chunk_rows rows when chunk_rows is given
+def read_csv_columns(source, columns, chunk_rows=None):
+    date_columns = [name for name, dtype in columns.items() if dtype.startswith('datetime')]
+    return pd.read_csv(source, usecols=lambda name: name in columns,
+                       dtype={name: dtype for name, dtype in columns.items() if name not in date_columns}, chunksize=chunk_rows)
+
+
+#create a function that converts the columns of a parsed report to their expected dtypes
+def apply_dtypes(data, columns):
+    for name, dtype in columns.items():
+        if name not in data.columns:
+            continue
+        if dtype.startswith('datetime'):
+            data[name] = pd.to_datetime(data[name], errors='coerce')
+        else:
+            #empty cells are stored as NaN like pd.read_excel does
+            data[name] = data[name].astype(dtype).where(data[name].notna(), np.nan)
+            #columns that mix numbers and text cannot be saved to feather, store the non-empty values of these columns as text
+            if len(set(type(value) for value in data[name].dropna())) > 1:
+                data[name] = data[name].where(data[name].isna(), data[name].astype(str))
+    return data
+
+
+#create a function that builds the key of a parsed upload, the column specification is part of the key so changing the columns ignores old feather files
+def upload_key(file_hash, columns):
+    columns_hash = hashlib.sha256(repr(sorted(columns.items())).encode()).hexdigest()[:8]
+    return f'{file_hash}-{columns_hash}'
+
+
+#create a function that reads a saved feather file, returns None when there is no usable file
+def read_sidecar(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        data = pd.read_feather(path)
+    #an unreadable file (or missing pyarrow) is treated like a missing file and the upload is parsed again
+    except (ImportError, OSError, ValueError):
+        return None
+    #feather stores empty text cells as None, convert them back to NaN so saved and freshly parsed uploads match
+    for name in data.columns[data.dtypes == object]:
+        data[name] = data[name].where(data[name].notna(), np.nan)
+    return data
+
+
+#create a function that saves a parsed upload as a feather file, the upload still works if the file cannot be written
+def write_sidecar(data, path):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #write to a temporary file first so a half written file is never read
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        data.to_feather(temporary_path)
+        os.replace(temporary_path, path)
+    except (ImportError, OSError, ValueError):
+        pass
+
+
+#create a function that parses the bytes of an uploaded report, CSV files use the CSV reader and everything else is read as Excel
+def parse_report(data, file_name, columns):
+    if file_name.lower().endswith('.csv'):
+        parsed = read_csv_columns(io.BytesIO(data), columns)
+    else:
+        parsed = read_excel_columns(io.BytesIO(data), columns)
+    return apply_dtypes(parsed, columns)
+
+
+#create a function that reads a report in chunks of at most chunk_rows rows without ever holding the whole report as a dataframe
+#source is a file path or the bytes of an upload, CSV files use the CSV reader and everything else is read as Excel
+def iter_report_chunks(source, file_name, columns, chunk_rows):
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if file_name.lower().endswith('.csv'):
+        chunks = read_csv_columns(source, columns, chunk_rows)
+    else:
+        chunks = iter_excel_chunks(source, columns, chunk_rows)
+    for chunk in chunks:
+        yield apply_dtypes(chunk, columns)
+
+
+#create a function that loads an uploaded report, checking the in-memory cache and the saved feather files before parsing the upload
+#returns the hash of the uploaded bytes and a copy of the parsed dataframe
+def load_report(uploaded_file, columns):
+    with span(f'load {uploaded_file.name}') as record:
+        data = uploaded_file.getvalue()
+        file_hash = content_hash(data)
+        key = upload_key(file_hash, columns)
+        parsed = upload_cache.get(key)
+        #record where the dataframe came from so cache hits can be told apart from parsing in the profile
+        record['source'] = 'memory cache'
+        if parsed is None:
+            path = os.path.join(SIDECAR_DIR, f'{key}.feather')
+            parsed = read_sidecar(path)
+            record['source'] = 'feather file'
+            if parsed is None:
+                parsed = parse_report(data, uploaded_file.name, columns)
+                write_sidecar(parsed, path)
+                record['source'] = 'parsed upload'
+            upload_cache.put(key, parsed)
+        record['rows'] = len(parsed)
+        #return a copy so later processing cannot change the cached dataframe
+        return file_hash, parsed.copy()
+
+
+#create functions that load the supply chain and sales reports with their column whitelists
+def load_supply_chain_report(uploaded_file):
+    return load_report(uploaded_file, SUPPLY_CHAIN_COLUMNS)
+
+
+def load_sales_report(uploaded_file):
+    return load_report(uploaded_file, SALES_COLUMNS)
@@ -0,0 +1,147 @@
+#timing instrumentation of the SLA pipeline
+#pipeline steps are wrapped in spans:
+#   with span('merge') as record:
+#       raw_data = merge_reports(...)
+#       record['rows'] = len(raw_data)
+#spans only record anything while a profiler is active in the current thread (with profiling(Profiler()): ...), otherwise they cost one function call
+
+#import necessary packages
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+
+#profiler of the current thread, streamlit runs each user session in its own thread so sessions never share a profiler
+active = threading.local()
+
+
+#create a span that records nothing, returned while no profiler is active
+class NullSpan:
+
+    def __enter__(self):
+        #values set on the record are thrown away
+        return {}
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+#create a class that records the wall time, rows processed and peak memory of every span
+class Profiler:
+
+    def __init__(self, memory=False, cprofile=False):
+        #list of finished spans in the order they started
+        self.spans = []
+        #trace the peak memory of every span with tracemalloc, this slows the pipeline down
+        self.memory = memory
+        #collect cProfile statistics of the whole profiled run
+        self.profile = cProfile.Profile() if cprofile else None
+        #spans that are running, the innermost span is last
+        self.stack = []
+        #whether this profiler started tracemalloc and has to stop it
+        self.started_tracemalloc = False
+
+    #start profiling
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        if self.profile is not None:
+            self.profile.enable()
+
+    #stop profiling
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    #create a span, the returned record can be given a row count or any other value while the span runs
+    @contextmanager
+    def span(self, name):
+        record = {'name': name, 'depth': len(self.stack), 'seconds': None, 'rows': None}
+        self.spans.append(record)
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            #the peak of the enclosing span so far is kept before the peak is reset for this span
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'start': current, 'peak': current}
+        else:
+            frame = None
+        self.stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            self.stack.pop()
+            if frame is not None and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], frame['peak'])
+                record['peak_mb'] = (peak - frame['start']) / 2**20
+                #the enclosing span peaked at least as high as this span
+                if self.stack and self.stack[-1] is not None:
+                    self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+
+    #create a list of the spans with the time of every span rounded for display
+    def records(self):
+        return [{**record, 'seconds': None if record['seconds'] is None else round(record['seconds'], 4)} for record in self.spans]
+
+    #create a table of the spans for display, nested spans are indented under the span that contains them
+    def table(self):
+        table = pd.DataFrame(self.records(), columns=['name', 'depth', 'seconds', 'rows', 'peak_mb', 'source'])
+        table['name'] = ['    ' * depth + name for name, depth in zip(table['name'], table['depth'])]
+        table['peak_mb'] = table['peak_mb'].astype(float).round(1)
+        return table.drop(columns='depth').rename(columns={'name': 'Step', 'seconds': 'Seconds', 'rows': 'Rows', 'peak_mb': 'Peak Memory (MB)', 'source': 'Source'})
+
+    #export the spans as JSON
+    def to_json(self):
+        return json.dumps({'spans': self.records()}, indent=2, default=str)
+
+    #export the cProfile statistics in the format read by pstats and snakeviz, returns None when cProfile was not collected
+    def to_pstats(self):
+        if self.profile is None:
+            return None
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        return marshal.dumps(stats.stats)
+
+
+#create a function that makes a profiler the active profiler of the current thread and starts it, None stops profiling
+#the previously active profiler is stopped, so a script that stopped halfway never leaves a profiler running
+def set_profiler(profiler):
+    previous = getattr(active, 'profiler', None)
+    if previous is not None:
+        previous.stop()
+    active.profiler = profiler
+    if profiler is not None:
+        profiler.start()
+
+
+#create a context manager that profiles the block with a profiler
+@contextmanager
+def profiling(profiler):
+    set_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        set_profiler(None)
+
+
+#create a span in the active profiler of the current thread, or a span that records nothing when no profiler is active
+def span(name):
+    profiler = getattr(active, 'profiler', None)
+    if profiler is None:
+        return NULL_SPAN
+    return profiler.span(name)
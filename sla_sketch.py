@@ -0,0 +1,307 @@
+#mergeable quantile sketches of the time elapsed, used by the approximate statistics mode
+#a sketch counts the values in buckets whose bounds grow by a constant factor, so every quantile it returns is within relative_accuracy of a value at that rank,
+#and two sketches with the same accuracy merge by adding their bucket counts, for example the sketches of report chunks or regions
+#usage:
+#   python sla_sketch.py validate --rows 100000 --accuracy 0.01
+#   python sla_sketch.py merge sla_output/*/sketches.json --by Month
+#validate compares the sketch statistics with the exact describe() output of synthetic reports, merge combines the sketches.json files written by sla_batch.py --sketch-accuracy
+
+#import necessary packages
+import argparse
+import json
+import math
+import sys
+from collections import Counter
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+from sla_engine import STAGE_NAMES
+
+
+#relative accuracy of the quantiles returned by a sketch
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+#values closer to zero than this are counted as zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+#columns a stage can be sketched by, missing values are grouped as 'N/A' like in the aggregate cube
+SKETCH_DIMENSIONS = ['Month', 'Account Name', 'Opportunity Type', 'Asset Type']
+
+#dimensions of the sketches kept by the approximate statistics mode, one sketch per stage, month and account
+SKETCH_BY = ['Month', 'Account Name']
+
+#quantiles reported by describe(), the sketch statistics use the same index
+DESCRIBE_QUANTILES = {'25%': 0.25, '50%': 0.5, '75%': 0.75}
+
+
+#create a mergeable quantile sketch
+class QuantileSketch:
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f'relative accuracy must be between 0 and 1, got {relative_accuracy}')
+        self.relative_accuracy = relative_accuracy
+        #bucket i holds the values between gamma ** (i - 1) and gamma ** i
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        #counts of the positive and negative values per bucket, negative values are bucketed by their absolute value
+        self.positive = Counter()
+        self.negative = Counter()
+        self.zero_count = 0
+        #count, sum, sum of squares, minimum and maximum are kept exactly, they merge exactly too
+        self.count = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    #add an array of values to the sketch, missing values are skipped
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.sum_squares += float((values * values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        signs, buckets = self.buckets(values)
+        self.zero_count += int((signs == 0).sum())
+        for store, sign in ((self.positive, 1), (self.negative, -1)):
+            indexes, counts = np.unique(buckets[signs == sign], return_counts=True)
+            store.update(dict(zip(indexes.tolist(), counts.tolist())))
+        return self
+
+    #return the sign (-1, 0 or 1, values closer to zero than MIN_INDEXABLE_VALUE count as zero) and the bucket of every value, zeros are in bucket 0
+    def buckets(self, values):
+        magnitudes = np.abs(values)
+        indexable = magnitudes > MIN_INDEXABLE_VALUE
+        signs = np.where(indexable, np.sign(values), 0).astype(np.int8)
+        buckets = np.zeros(len(values), dtype=np.int64)
+        buckets[indexable] = np.ceil(np.log(magnitudes[indexable]) / self.log_gamma)
+        return signs, buckets
+
+    #merge another sketch into this sketch, both sketches must have the same relative accuracy
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f'cannot merge sketches with relative accuracies {self.relative_accuracy} and {other.relative_accuracy}')
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    #return the value of a bucket, the point of the bucket with the same relative distance to both bounds
+    def bucket_value(self, bucket):
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    #return the approximate q quantile (0 <= q <= 1), NaN for an empty sketch
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        #the value with rank q * (count - 1), counting from the smallest value
+        rank = q * (self.count - 1)
+        seen = 0
+        #negative values from the largest magnitude down, then zeros, then positive values from the smallest magnitude up
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return max(-self.bucket_value(bucket), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return min(self.bucket_value(bucket), self.max)
+        return self.max
+
+    #create a series shaped like the describe() output of the values in the sketch, count, mean, std, min and max are exact
+    def describe(self):
+        if self.count:
+            mean = self.sum / self.count
+            variance = (self.sum_squares - self.count * mean * mean) / (self.count - 1) if self.count > 1 else math.nan
+            std = math.sqrt(max(variance, 0)) if self.count > 1 else math.nan
+            minimum, maximum = self.min, self.max
+        else:
+            mean = std = minimum = maximum = math.nan
+        return pd.Series({'count': float(self.count), 'mean': mean, 'std': std, 'min': minimum,
+                          **{name: self.quantile(q) for name, q in DESCRIBE_QUANTILES.items()}, 'max': maximum}, name='Time Elapsed (Days)')
+
+    #create a dictionary of the sketch that can be written as JSON
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'count': self.count, 'sum': self.sum, 'sum_squares': self.sum_squares,
+            'min': self.min if self.count else None, 'max': self.max if self.count else None,
+            'zero_count': self.zero_count,
+            'positive': {str(bucket): count for bucket, count in self.positive.items()},
+            'negative': {str(bucket): count for bucket, count in self.negative.items()},
+        }
+
+    #create a sketch from a dictionary written by to_dict
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.count, sketch.sum, sketch.sum_squares = data['count'], data['sum'], data['sum_squares']
+        if data['count']:
+            sketch.min, sketch.max = data['min'], data['max']
+        sketch.zero_count = data['zero_count']
+        sketch.positive.update({int(bucket): count for bucket, count in data['positive'].items()})
+        sketch.negative.update({int(bucket): count for bucket, count in data['negative'].items()})
+        return sketch
+
+
+#create a function that sketches the time elapsed of every stage dataframe per combination of the given dimensions
+#returns a dictionary keyed by (stage name, dimension values...), months are 'YYYY-MM' text and missing values are 'N/A'
+def build_sketches(df_list, dimensions, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    sketches = {}
+    template = QuantileSketch(relative_accuracy)
+    for stage_name, df in zip(STAGE_NAMES, df_list):
+        df = df[df['Time Elapsed (Days)'].notna()]
+        days = df['Time Elapsed (Days)']
+        #each month is written as text once
+        months = {month: month.strftime('%Y-%m') for month in pd.DatetimeIndex(df['Date'].dropna().unique())}
+        columns = [df['Date'].map(months) if dimension == 'Month' else df[dimension].astype(object) for dimension in dimensions]
+        #a constant key sketches the whole stage when there are no dimensions
+        columns = [column.fillna('N/A').rename(dimension) for column, dimension in zip(columns, dimensions)] or [pd.Series(0, index=df.index)]
+        #the exact totals of every group, and the bucket counts of every group in one pass over the stage
+        totals = days.groupby(columns, sort=False).agg(['count', 'sum', 'min', 'max'])
+        totals['sum_squares'] = (days * days).groupby(columns, sort=False).sum()
+        signs, buckets = template.buckets(days.values)
+        counts = days.groupby(columns + [pd.Series(signs, index=df.index), pd.Series(buckets, index=df.index)], sort=False).size()
+        group_sketches = {}
+        for key, count, total, total_squares, minimum, maximum in totals[['count', 'sum', 'sum_squares', 'min', 'max']].itertuples(name=None):
+            sketch = QuantileSketch(relative_accuracy)
+            sketch.count, sketch.sum, sketch.sum_squares, sketch.min, sketch.max = int(count), float(total), float(total_squares), float(minimum), float(maximum)
+            group_sketches[key] = sketch
+        for key, count in counts.items():
+            *group, sign, bucket = key
+            sketch = group_sketches[group[0] if len(group) == 1 else tuple(group)]
+            if sign == 0:
+                sketch.zero_count += count
+            else:
+                (sketch.positive if sign > 0 else sketch.negative)[bucket] = count
+        for key, sketch in group_sketches.items():
+            sketches[(stage_name,) + (key if isinstance(key, tuple) else (key,)) if dimensions else (stage_name,)] = sketch
+    return sketches
+
+
+#create a function that merges sketches into one sketch per key of fewer dimensions
+#keep lists the positions of the key parts that are kept, the stage name is at position 0
+def merge_sketches(sketches, keep):
+    merged = {}
+    for key, sketch in sketches.items():
+        merged_key = tuple(key[position] for position in keep)
+        if merged_key not in merged:
+            merged[merged_key] = QuantileSketch(sketch.relative_accuracy)
+        merged[merged_key].merge(sketch)
+    return merged
+
+
+#create a function that describes every stage from sketches of any dimensions, stages without values are described like an empty column
+def describe_sketched_stages(sketches, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    stages = merge_sketches(sketches, [0])
+    return [stages.get((stage_name,), QuantileSketch(relative_accuracy)).describe() for stage_name in STAGE_NAMES]
+
+
+#create a function that keeps the sketches whose dimension values match the selected values of every dimension with a selection
+#selections maps dimensions to lists of selected values like the page filters, months may be timestamps, returns None when a dimension with a selection was not sketched
+def select_sketches(sketches, dimensions, selections):
+    allowed = {}
+    for dimension, selected in selections.items():
+        if not selected:
+            continue
+        if dimension not in dimensions:
+            return None
+        allowed[list(dimensions).index(dimension) + 1] = {pd.Timestamp(value).strftime('%Y-%m') if dimension == 'Month' else value for value in selected}
+    return {key: sketch for key, sketch in sketches.items() if all(key[position] in values for position, values in allowed.items())}
+
+
+#create a function that switches a computed SLA result to approximate statistics
+#the stage statistics are described from sketches per stage, month and account, which are kept in the result so they can be saved and merged with other results
+def sketch_statistics(result, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    sketches = build_sketches(result.df_list, SKETCH_BY, relative_accuracy)
+    return replace(result, stats=describe_sketched_stages(sketches, relative_accuracy), sketches=sketches)
+
+
+#create a function that writes sketches and their dimensions to a JSON file
+def write_sketches(sketches, dimensions, path):
+    with open(path, 'w') as sketch_file:
+        json.dump({'dimensions': ['Stage'] + list(dimensions), 'sketches': [{'key': list(key), 'sketch': sketch.to_dict()} for key, sketch in sketches.items()]}, sketch_file)
+
+
+#create a function that reads sketches written by write_sketches, returns the dimensions and the sketches
+def read_sketches(path):
+    with open(path) as sketch_file:
+        data = json.load(sketch_file)
+    return data['dimensions'], {tuple(entry['key']): QuantileSketch.from_dict(entry['sketch']) for entry in data['sketches']}
+
+
+#create a function that checks the sketch statistics of every stage against the exact describe() output
+#a sketch quantile is correct when it is within the relative accuracy of a value between the two values describe() interpolates between
+def validate_sketches(df_list, exact_stats, relative_accuracy):
+    records = []
+    sketched_stats = describe_sketched_stages(build_sketches(df_list, [], relative_accuracy), relative_accuracy)
+    for stage_name, df, exact, sketched in zip(STAGE_NAMES, df_list, exact_stats, sketched_stats):
+        days = np.sort(df['Time Elapsed (Days)'].dropna().values)
+        for statistic in exact.index:
+            if statistic in DESCRIBE_QUANTILES and len(days):
+                #the values describe() interpolates between
+                rank = DESCRIBE_QUANTILES[statistic] * (len(days) - 1)
+                bounds = days[math.floor(rank)], days[math.ceil(rank)]
+                low = min(bounds[0] * (1 - relative_accuracy), bounds[0] * (1 + relative_accuracy)) - MIN_INDEXABLE_VALUE
+                high = max(bounds[1] * (1 - relative_accuracy), bounds[1] * (1 + relative_accuracy)) + MIN_INDEXABLE_VALUE
+                within = bool(low <= sketched[statistic] <= high)
+            else:
+                #count, mean, std, min and max are kept exactly, up to floating point error
+                within = bool(np.isclose(exact[statistic], sketched[statistic], equal_nan=True))
+            records.append({'stage': stage_name, 'statistic': statistic, 'exact': exact[statistic], 'sketch': sketched[statistic], 'within_bounds': within})
+    return pd.DataFrame(records)
+
+
+#create the command line interface
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate and merge quantile sketches of the SLA stage durations.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    validate = commands.add_parser('validate', help='compare the sketch statistics with the exact describe() output of synthetic reports')
+    validate.add_argument('--rows', type=int, default=100000, help='number of audit rows of the synthetic supply chain report (default: 100000)')
+    validate.add_argument('--accuracy', type=float, default=DEFAULT_RELATIVE_ACCURACY, help=f'relative accuracy of the sketches (default: {DEFAULT_RELATIVE_ACCURACY})')
+    validate.add_argument('--seed', type=int, default=0, help='random seed of the synthetic reports (default: 0)')
+    merge = commands.add_parser('merge', help='merge sketches.json files and print the statistics of every stage')
+    merge.add_argument('paths', nargs='+', help='sketches.json files written by sla_batch.py --sketch-accuracy')
+    merge.add_argument('--by', nargs='*', default=[], choices=SKETCH_DIMENSIONS, help='dimensions to keep in the merged statistics (default: stage only)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'validate':
+        #imported here so merging sketches does not need the synthetic report generator
+        from sla_engine import compute_sla_frames
+        from sla_synthetic import generate_reports
+        result = compute_sla_frames(*generate_reports(args.rows, args.seed))
+        checks = validate_sketches(result.df_list, result.stats, args.accuracy)
+        print(checks.to_string(index=False))
+        failures = checks[~checks['within_bounds']]
+        print(f'{len(checks) - len(failures)} of {len(checks)} statistics within {args.accuracy:.2%} of the exact values', file=sys.stderr)
+        return 1 if len(failures) else 0
+
+    #merge the sketches of every file, keeping the requested dimensions
+    merged = {}
+    for path in args.paths:
+        dimensions, sketches = read_sketches(path)
+        missing = [dimension for dimension in args.by if dimension not in dimensions]
+        if missing:
+            parser.error(f'{path} has no {", ".join(missing)} sketches')
+        for key, sketch in merge_sketches(sketches, [0] + [dimensions.index(dimension) for dimension in args.by]).items():
+            merged[key] = merged[key].merge(sketch) if key in merged else sketch
+    statistics = pd.DataFrame([sketch.describe() for sketch in merged.values()], index=pd.MultiIndex.from_tuples(list(merged), names=['Stage'] + args.by))
+    print(statistics.sort_index().round(2).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
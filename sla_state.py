@@ -0,0 +1,106 @@
+#import necessary packages
+import os
+import threading
+import numpy as np
+import pandas as pd
+from sla_engine import REF_COL, STATE_COLUMNS, extract_reference_state
+from sla_ingest import SIDECAR_DIR, read_sidecar, write_sidecar
+
+
+#columns of the merged dataframe that decide the state of a shipping reference number, a reference whose rows change in any of these columns is processed again
+FINGERPRINT_COLUMNS = [REF_COL, 'Opportunity', 'Account Name_x', 'Field / Event', 'Old Value', 'New Value', 'Edit Date', 'Status']
+
+#file where the reference states of the last processed supply chain report are saved
+STATE_PATH = os.path.join(SIDECAR_DIR, 'reference_state.feather')
+
+
+#create a function that fingerprints the audit rows of every shipping reference number
+#each row is hashed together with its position among the rows of its reference, so adding, removing, changing or reordering rows changes the fingerprint
+def reference_fingerprints(raw_data):
+    rows = raw_data.loc[raw_data[REF_COL].notna(), FINGERPRINT_COLUMNS]
+    if rows.empty:
+        return pd.Series(dtype='uint64')
+    position = rows.groupby(REF_COL, sort=False).cumcount()
+    row_hashes = pd.util.hash_pandas_object(rows.assign(Position=position.values), index=False).values
+    #combine the row hashes of each reference with xor, the rows of each reference are made contiguous with a stable sort
+    codes, refs = pd.factorize(rows[REF_COL])
+    order = np.argsort(codes, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    return pd.Series(np.bitwise_xor.reduceat(row_hashes[order], starts), index=refs)
+
+
+#create a function that extracts the state of the given audit rows together with their fingerprints and latest edit dates
+def extract_fingerprinted_state(raw_data):
+    state = extract_reference_state(raw_data)
+    state['fingerprint'] = reference_fingerprints(raw_data)
+    state['last_edit'] = raw_data.groupby(REF_COL)['Edit Date'].max()
+    return state
+
+
+#create a store that keeps the state of every shipping reference number between uploads
+#a new upload only extracts the references with audit rows newer than the stored high-water mark (the latest stored edit date),
+#new references and references whose older rows changed, every other reference reuses its stored state
+class ReferenceStateStore:
+
+    def __init__(self, path=STATE_PATH):
+        #feather file holding the stored states
+        self.path = path
+        #description of the last update for display
+        self.last_update = 'No upload processed yet'
+        #streamlit runs each user session in its own thread, only one session updates the file at a time
+        self.lock = threading.Lock()
+
+    #read the stored states, returns None when nothing is stored
+    #states saved before a state column was added are ignored, every reference is then extracted again
+    def load(self):
+        state = read_sidecar(self.path)
+        if state is None or not set(STATE_COLUMNS).issubset(state.columns):
+            return None
+        return state.set_index(REF_COL)
+
+    #save the states
+    def save(self, state):
+        write_sidecar(state.rename_axis(REF_COL).reset_index(), self.path)
+
+    #update the stored states with a merged dataframe and return the state of every shipping reference number in it
+    def update(self, raw_data):
+        with self.lock:
+            stored = self.load()
+            refs = pd.Index(raw_data[REF_COL].dropna().unique(), name=REF_COL)
+            if stored is None:
+                unchanged = refs[:0]
+                new_row_count = len(raw_data)
+                high_water_mark = None
+            else:
+                high_water_mark = stored['last_edit'].max()
+                #audit rows edited after the high-water mark, rows without an edit date count as old rows
+                new_rows = (raw_data['Edit Date'] > high_water_mark).values
+                new_row_count = int(new_rows.sum())
+                touched = raw_data.loc[new_rows, REF_COL].dropna().unique()
+                #a reference is unchanged when it has no new rows and its old rows match the stored fingerprint
+                old_fingerprints = reference_fingerprints(raw_data[~new_rows])
+                matches = old_fingerprints == stored['fingerprint'].reindex(old_fingerprints.index)
+                unchanged = old_fingerprints.index[matches.values & ~old_fingerprints.index.isin(touched)]
+
+            #extract the state of the new and changed references from all of their audit rows
+            changed = refs[~refs.isin(unchanged)]
+            if len(changed):
+                changed_state = extract_fingerprinted_state(raw_data[raw_data[REF_COL].isin(changed)])
+            #nothing to extract, use an empty state with the stored columns, or the columns of an extracted state when nothing is stored
+            elif stored is not None:
+                changed_state = stored.iloc[:0]
+            else:
+                changed_state = extract_fingerprinted_state(raw_data.iloc[:0])
+            if len(unchanged):
+                state = pd.concat([stored.loc[unchanged], changed_state])
+            else:
+                state = changed_state
+            state = state.reindex(refs)
+
+            self.save(state)
+            self.last_update = f'{len(unchanged)} references reused, {len(changed)} references processed, {new_row_count} audit rows after {high_water_mark}'
+            return state
+
+
+#store shared by every session of the application
+state_store = ReferenceStateStore()
@@ -0,0 +1,182 @@
+#import necessary packages
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from sla_ingest import SIDECAR_DIR
+
+
+#SQLite file holding the stage durations of every processed upload
+STORE_PATH = os.path.join(SIDECAR_DIR, 'sla_facts.sqlite')
+
+#stage name of the total order time rows, the same name the application uses for the total order time section
+TOTAL_STAGE = 'Total Order Time'
+
+#columns of the stage facts table and the order info columns they are filled from
+FACT_COLUMNS = {
+    'ref': 'Shipping Reference Number',
+    'stage': 'Order Status Change',
+    'days': 'Time Elapsed (Days)',
+    'account': 'Account Name',
+    'opportunity': 'Opportunity Name',
+    'opportunity_type': 'Opportunity Type',
+    'asset_type': 'Asset Type',
+    'closed_won': 'Closed Won',
+    'out_of_stock': 'Order Out of Stock',
+    'shipped': 'Order Shipped',
+    'cancelled': 'Cancelled Order',
+    'month': 'Date',
+}
+
+#dimensions the stored facts can be grouped and filtered by, as display name: column
+DIMENSIONS = {
+    'Stage': 'stage',
+    'Month': 'month',
+    'Account Name': 'account',
+    'Opportunity Type': 'opportunity_type',
+    'Asset Type': 'asset_type',
+}
+
+#tables and indexes of the store
+#every shipping reference number keeps the stage durations of the latest upload it appeared in, so the same order is never counted twice
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id INTEGER PRIMARY KEY,
+    supply_chain_hash TEXT NOT NULL,
+    sales_hash TEXT NOT NULL,
+    stored_at TEXT NOT NULL,
+    reference_count INTEGER NOT NULL,
+    UNIQUE (supply_chain_hash, sales_hash)
+);
+CREATE TABLE IF NOT EXISTS stage_facts (
+    ref TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    days REAL,
+    account TEXT,
+    opportunity TEXT,
+    opportunity_type TEXT,
+    asset_type TEXT,
+    closed_won TEXT,
+    out_of_stock TEXT,
+    shipped TEXT,
+    cancelled TEXT,
+    month TEXT,
+    upload_id INTEGER NOT NULL REFERENCES uploads (upload_id),
+    PRIMARY KEY (ref, stage)
+);
+CREATE INDEX IF NOT EXISTS stage_facts_account ON stage_facts (account);
+CREATE INDEX IF NOT EXISTS stage_facts_stage_month ON stage_facts (stage, month);
+CREATE INDEX IF NOT EXISTS stage_facts_month ON stage_facts (month);
+'''
+
+
+#create a function that writes dates as text, each distinct date is only formatted once
+def iso_text(dates, date_format):
+    dates = pd.to_datetime(dates)
+    labels = {date: date.strftime(date_format) for date in pd.DatetimeIndex(dates.dropna().unique())}
+    return dates.map(labels)
+
+
+#create a function that builds the stage fact rows of a computed SLA result
+#the order info rows with a status change become one fact each, and the total order time of every shipping reference number becomes a fact of stage TOTAL_STAGE
+def build_facts(result):
+    stage_rows = result.order_info[result.order_info['Order Status Change'].notna()]
+    total_rows = result.df_list[6].assign(**{'Order Status Change': TOTAL_STAGE})
+    facts = pd.concat([stage_rows, total_rows], ignore_index=True)[list(FACT_COLUMNS.values())]
+    facts.columns = list(FACT_COLUMNS)
+    #dates are stored as ISO text, which SQLite sorts and compares in date order, months as the first day of the month
+    facts['month'] = iso_text(facts['month'], '%Y-%m-%d')
+    facts['closed_won'] = iso_text(facts['closed_won'], '%Y-%m-%d %H:%M:%S')
+    #a shipping reference number can reach the same stage once
+    return facts.drop_duplicates(subset=['ref', 'stage'], keep='last')
+
+
+#create a store that keeps the stage durations of processed uploads in a SQLite file, so historical SLAs can be queried without the original uploads
+class FactStore:
+
+    def __init__(self, path=STORE_PATH):
+        #SQLite file holding the facts
+        self.path = path
+        #streamlit runs each user session in its own thread, only one session writes to the file at a time
+        self.lock = threading.Lock()
+
+    #open a connection, every call opens and closes its own connection because SQLite connections cannot be shared between threads
+    def connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.executescript(SCHEMA)
+        return connection
+
+    #store the stage durations of a computed SLA result in a background thread, so saving does not delay the page
+    def store_result_in_background(self, result, supply_chain_hash, sales_hash):
+        thread = threading.Thread(target=self.store_result, args=(result, supply_chain_hash, sales_hash), daemon=True)
+        thread.start()
+        return thread
+
+    #store the stage durations of a computed SLA result, the facts of its shipping reference numbers replace older facts of the same references
+    #returns False when the uploads were stored before
+    def store_result(self, result, supply_chain_hash, sales_hash):
+        facts = build_facts(result)
+        with self.lock, closing(self.connect()) as connection, connection:
+            if connection.execute('SELECT 1 FROM uploads WHERE supply_chain_hash = ? AND sales_hash = ?', (supply_chain_hash, sales_hash)).fetchone():
+                return False
+            upload_id = connection.execute(
+                'INSERT INTO uploads (supply_chain_hash, sales_hash, stored_at, reference_count) VALUES (?, ?, ?, ?)',
+                (supply_chain_hash, sales_hash, datetime.now(timezone.utc).isoformat(timespec='seconds'), len(result.total_times))).lastrowid
+            #remove every older fact of the uploaded references, stages a reference no longer reaches must not stay behind
+            connection.execute('CREATE TEMP TABLE upload_refs (ref TEXT PRIMARY KEY)')
+            connection.executemany('INSERT OR IGNORE INTO upload_refs VALUES (?)', ((ref,) for ref in result.total_times))
+            connection.execute('DELETE FROM stage_facts WHERE ref IN (SELECT ref FROM upload_refs)')
+            connection.execute('DROP TABLE upload_refs')
+            #missing values are stored as NULL
+            facts = facts.assign(upload_id=upload_id)
+            facts = facts.astype(object).where(facts.notna(), None)
+            connection.executemany(f'INSERT OR REPLACE INTO stage_facts ({", ".join(facts.columns)}) VALUES ({", ".join("?" * len(facts.columns))})',
+                                   facts.itertuples(index=False, name=None))
+        return True
+
+    #create a dataframe of the stored uploads
+    def uploads(self):
+        with closing(self.connect()) as connection:
+            return pd.read_sql_query('SELECT upload_id, stored_at, reference_count, supply_chain_hash, sales_hash FROM uploads ORDER BY upload_id', connection)
+
+    #create a list of the stored values of a dimension for filter choices
+    def values(self, dimension):
+        column = DIMENSIONS[dimension]
+        with closing(self.connect()) as connection:
+            return [row[0] for row in connection.execute(f'SELECT DISTINCT {column} FROM stage_facts WHERE {column} IS NOT NULL ORDER BY {column}')]
+
+    #create a dataframe of the stage durations grouped by the given dimensions, the grouping and aggregation run in SQLite
+    #filters maps dimension names to the list of values to keep, months is an optional (first month, last month) pair of 'YYYY-MM-DD' strings
+    def summarize(self, group_by, filters=None, months=None):
+        columns = [DIMENSIONS[dimension] for dimension in group_by]
+        conditions = ['days IS NOT NULL']
+        parameters = []
+        for dimension, values in (filters or {}).items():
+            if values:
+                conditions.append(f'{DIMENSIONS[dimension]} IN ({", ".join("?" * len(values))})')
+                parameters.extend(values)
+        if months is not None:
+            conditions.append('month BETWEEN ? AND ?')
+            parameters.extend(months)
+        select = ''.join(f'{column}, ' for column in columns)
+        grouping = f'GROUP BY {", ".join(columns)} ORDER BY {", ".join(columns)}' if columns else ''
+        query = (f'SELECT {select}COUNT(days) AS orders, AVG(days) AS mean, MIN(days) AS min, MAX(days) AS max, SUM(days * days) AS sum_squares '
+                 f'FROM stage_facts WHERE {" AND ".join(conditions)} {grouping}')
+        with closing(self.connect()) as connection:
+            summary = pd.read_sql_query(query, connection, params=parameters)
+        #the sample standard deviation from the count, mean and sum of squares, SQLite has no standard deviation function
+        n = summary['orders']
+        variance = ((summary['sum_squares'] - n * summary['mean'] ** 2) / (n - 1)).where(n > 1)
+        summary['std'] = np.sqrt(variance.clip(lower=0))
+        #name the columns like the summary statistics table of the application
+        summary = summary[columns + ['orders', 'mean', 'std', 'min', 'max']].round({'mean': 1, 'std': 1, 'min': 1, 'max': 1})
+        summary.columns = list(group_by) + ['Count', 'Mean', 'Std. Dev.', 'Min', 'Max']
+        return summary
+
+
+#store shared by every session of the application
+fact_store = FactStore()
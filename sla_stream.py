@@ -0,0 +1,116 @@
+#import necessary packages
+import pandas as pd
+from sla_engine import REF_COL, DEMO_ACCOUNT, TRANSITION_COLUMNS, add_out_of_stock_intervals, match_transitions, out_of_stock_events, stage_tables_from_state, summarize_stage_tables
+from sla_ingest import SUPPLY_CHAIN_COLUMNS, iter_report_chunks
+from sla_profile import span
+
+
+#number of audit rows read from the supply chain report at a time
+CHUNK_ROWS = 50000
+
+#name of the column holding the position of each opportunity in the order the opportunities first appear in the supply chain report
+OPPORTUNITY_CODE = 'Opportunity Code'
+
+
+#create a class that folds chunks of the supply chain report into the state of every shipping reference number
+#the merge of the whole report groups the audit rows by opportunity in the order the opportunities first appear, so the state is kept per
+#shipping reference number and opportunity and combined in that order at the end, which gives the same last row wins results as the merge
+class StreamingState:
+
+    def __init__(self):
+        #opportunities in the order they first appear in the supply chain report
+        self.opportunities = pd.Index([], dtype=object)
+        #edit date of the last matching audit row per shipping reference number, opportunity and status change
+        self.matched = None
+        #every audit row entering or leaving out of stock, every stock-out is paired at the end
+        self.events = None
+        #account name of the last audit row and whether any audit row was cancelled, per shipping reference number and opportunity
+        self.references = None
+        #number of audit rows folded so far
+        self.row_count = 0
+
+    #fold a chunk of the supply chain report into the state, the chunks must be added in file order
+    def add_chunk(self, chunk):
+        self.row_count += len(chunk)
+        keys = [REF_COL, OPPORTUNITY_CODE]
+
+        #remember the order in which the opportunities first appear, demo account rows count because the merge happens before they are removed
+        opportunities = pd.Index(chunk['Opportunity'].unique())
+        self.opportunities = self.opportunities.append(opportunities[~opportunities.isin(self.opportunities)])
+
+        #remove sales demo account rows and rows without a shipping reference number, and number the opportunities in first appearance order
+        chunk = chunk[(chunk['Account Name'] != DEMO_ACCOUNT) & chunk[REF_COL].notna()]
+        chunk = chunk.assign(**{OPPORTUNITY_CODE: self.opportunities.get_indexer(chunk['Opportunity'])})
+
+        #keep the last matching row per key and status change, rows of later chunks win
+        matched = match_transitions(chunk, keys)
+        if self.matched is not None:
+            matched = pd.concat([self.matched, matched], ignore_index=True).groupby(keys + ['Transition'], sort=False).tail(1)
+        self.matched = matched
+
+        #keep the out of stock events, they are few compared to the audit rows
+        events = out_of_stock_events(chunk, keys)
+        self.events = events if self.events is None else pd.concat([self.events, events], ignore_index=True)
+
+        #keep the last row per key with a flag marking keys with any cancelled row
+        references = pd.DataFrame({
+            REF_COL: chunk[REF_COL],
+            OPPORTUNITY_CODE: chunk[OPPORTUNITY_CODE],
+            'Account Name': chunk['Account Name'],
+            'cancelled': chunk['Status'] == 'Cancelled',
+        })
+        if self.references is not None:
+            references = pd.concat([self.references, references], ignore_index=True)
+        references['cancelled'] = references.groupby(keys, sort=False)['cancelled'].transform('any')
+        self.references = references.groupby(keys, sort=False).tail(1)
+
+    #combine the folded chunks into the state of every shipping reference number, and join the sales report once per shipping reference number
+    #the stock-outs are measured on the SLA clock of the business calendar when one is passed (see sla_calendar.py)
+    #returns the state and the reference attributes used by stage_tables_from_state
+    def finish(self, raw_sales_data, calendar=None):
+        #put the opportunities of each shipping reference number in merge order, a stable sort keeps the chunk order within each opportunity
+        matched = self.matched.sort_values(OPPORTUNITY_CODE, kind='mergesort')
+        references = self.references.sort_values(OPPORTUNITY_CODE, kind='mergesort')
+        refs = pd.Index(references[REF_COL].unique(), name=REF_COL)
+
+        #the last matching row of every shipping reference number and status change wins
+        matched = matched.groupby([REF_COL, 'Transition'], sort=False).tail(1)
+        state = matched.set_index([REF_COL, 'Transition'])['Edit Date'].unstack('Transition')
+        state = state.reindex(index=refs, columns=TRANSITION_COLUMNS).apply(pd.to_datetime)
+        state = add_out_of_stock_intervals(state, self.events.sort_values(OPPORTUNITY_CODE, kind='mergesort'), calendar)
+        state['cancelled'] = references.groupby(REF_COL, sort=False)['cancelled'].any().reindex(refs).values
+
+        #the last row of every shipping reference number belongs to its last opportunity
+        last = references.groupby(REF_COL, sort=False).tail(1).set_index(REF_COL).reindex(refs)
+        opportunities = self.opportunities[last[OPPORTUNITY_CODE].values]
+
+        #the last merged row of an opportunity holds its last sales row
+        sales = raw_sales_data.rename(columns={'Opportunity Name': 'Opportunity'})
+        sales = sales.drop_duplicates(subset='Opportunity', keep='last').set_index('Opportunity').reindex(opportunities)
+        reference_attributes = pd.DataFrame({
+            'Account Name': last['Account Name'].values,
+            'Opportunity Name': opportunities,
+            'Opportunity Type': sales['Opportunity Type'].values,
+            'Asset Type': sales['Asset Type'].values,
+            'Closed Won': pd.to_datetime(sales['Closed won date'], errors='coerce').values,
+        }, index=refs)
+        return state, reference_attributes
+
+
+#create a function that computes every SLA dataframe and statistic while reading the supply chain report in chunks
+#only the state of every shipping reference number is kept in memory, the merged dataframe is never built
+#supply_chain_source is a file path or the bytes of an upload, a business calendar measures the time elapsed on its SLA clock
+def compute_sla_frames_streaming(supply_chain_source, file_name, raw_sales_data, chunk_rows=CHUNK_ROWS, calendar=None):
+    streaming_state = StreamingState()
+    #reading and folding are timed together, the chunks are read while they are folded
+    with span('read and fold chunks') as record:
+        for chunk in iter_report_chunks(supply_chain_source, file_name, SUPPLY_CHAIN_COLUMNS, chunk_rows):
+            streaming_state.add_chunk(chunk)
+        record['rows'] = streaming_state.row_count
+    with span('transitions') as record:
+        state, reference_attributes = streaming_state.finish(raw_sales_data, calendar)
+        record['rows'] = len(state)
+    with span('stage tables') as record:
+        df_list, total_times = stage_tables_from_state(state, reference_attributes, calendar)
+        record['rows'] = len(total_times)
+    return summarize_stage_tables(df_list, total_times)
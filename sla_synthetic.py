@@ -0,0 +1,164 @@
+#command line tool and functions that generate synthetic supply chain and sales reports for benchmarks and trying the application without real data
+#usage:
+#   python sla_synthetic.py 100000 --out reports/ --name synthetic --format csv
+#writes reports/synthetic_supply_chain.csv and reports/synthetic_sales.csv, the file names sla_batch.py looks for
+
+#import necessary packages
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+from sla_engine import DEMO_ACCOUNT, REF_COL
+
+
+#probabilities that shape the generated order histories
+#share of orders that are confirmed after they are created
+CONFIRMED_SHARE = 0.9
+#number of out of stock cycles an order goes through, picked uniformly from this list
+OUT_OF_STOCK_CYCLES = [0, 0, 0, 1, 2]
+#share of accepted orders that are shipped
+SHIPPED_SHARE = 0.85
+#share of orders with a cancelled status
+CANCELLED_SHARE = 0.05
+#share of orders from the sales demo account
+DEMO_SHARE = 0.03
+#share of opportunities missing from the sales report, and of sales rows without a closed won date
+MISSING_SALES_SHARE = 0.05
+MISSING_CLOSED_WON_SHARE = 0.02
+#largest number of days between two status changes
+MAX_STEP_DAYS = 10
+
+#values of the generated sales columns
+ACCOUNT_COUNT = 40
+OPPORTUNITY_TYPES = np.array(['New', 'Renewal', None], dtype=object)
+ASSET_TYPES = np.array(['Fleet', 'Telematics', None], dtype=object)
+
+#status change audit rows, as (Field / Event, Old Value, New Value)
+CREATED_ROW = ('Created.', None, None)
+CONFIRMED_ROW = ('Status', 'Not confirmed', 'Confirmed')
+OUT_OF_STOCK_ROW = ('Status', 'Confirmed', 'Out of stock')
+REPEAT_OUT_OF_STOCK_ROW = ('Status', 'Order accepted', 'Out of stock')
+BACK_IN_STOCK_ROW = ('Status', 'Out of stock', 'Order accepted')
+ACCEPTED_ROW = ('Status', 'Confirmed', 'Order accepted')
+SHIPPED_ROW = ('Status', 'Order accepted', 'Shipped')
+#audit row that does not change the status, added to make longer audit trails
+COMMENT_ROW = ('Comment', None, 'Updated')
+
+
+#create a function that picks the audit rows of every order
+#returns the order number and the (Field / Event, Old Value, New Value) of every audit row in history order
+def order_events(rng, order_count, comment_rows):
+    confirmed = rng.random(order_count) < CONFIRMED_SHARE
+    cycles = np.where(confirmed, rng.choice(OUT_OF_STOCK_CYCLES, order_count), 0)
+    shipped = confirmed & (rng.random(order_count) < SHIPPED_SHARE)
+    comments = rng.poisson(comment_rows, order_count) if comment_rows else np.zeros(order_count, dtype=int)
+
+    #rows per order: created, confirmed, two rows per out of stock cycle or one accepted row, shipped, comments
+    row_counts = 1 + confirmed * (1 + np.maximum(2 * cycles, 1) + shipped) + comments
+    order = np.repeat(np.arange(order_count), row_counts)
+    #position of every row within its order
+    position = np.arange(len(order)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+    status_rows = (row_counts - comments)[order]
+    row_cycles = cycles[order]
+
+    #pick the audit row at every position, comments come after the status changes
+    choices = [
+        position >= status_rows,
+        position == 0,
+        position == 1,
+        (position == 2) & (row_cycles == 0),
+        (position == 2),
+        (position < 2 + 2 * row_cycles) & (position % 2 == 0),
+        (position < 2 + 2 * row_cycles),
+    ]
+    rows = [COMMENT_ROW, CREATED_ROW, CONFIRMED_ROW, ACCEPTED_ROW, OUT_OF_STOCK_ROW, REPEAT_OUT_OF_STOCK_ROW, BACK_IN_STOCK_ROW]
+    events = [np.select(choices, [np.full(len(order), row[column], dtype=object) for row in rows], default=SHIPPED_ROW[column])
+              for column in range(3)]
+    return order, events
+
+
+#create a function that generates a supply chain report and a matching sales report
+#the supply chain report has roughly row_count audit rows, comment_rows adds that many status-free audit rows per order on average
+def generate_reports(row_count, seed=0, comment_rows=0, shuffle=False):
+    rng = np.random.default_rng(seed)
+    #an order has about four status change rows, generate enough orders and keep the orders that fit in row_count
+    order_count = max(1, int(row_count / (4 + comment_rows)) + 1)
+    order, (field_event, old_value, new_value) = order_events(rng, order_count, comment_rows)
+    keep = np.searchsorted(order, order[min(row_count, len(order)) - 1], side='right')
+    order, field_event, old_value, new_value = order[:keep], field_event[:keep], old_value[:keep], new_value[:keep]
+    order_count = order[-1] + 1
+
+    #order details
+    references = np.char.add('SR-', np.char.zfill(np.arange(order_count).astype(str), 7))
+    opportunities = np.char.add('Opp ', np.arange(order_count).astype(str))
+    accounts = np.char.add('Account ', rng.integers(0, ACCOUNT_COUNT, order_count).astype(str)).astype(object)
+    accounts[rng.random(order_count) < DEMO_SHARE] = DEMO_ACCOUNT
+    closed_won = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.uniform(0, 500, order_count).round(), unit='D')
+    status = np.where(rng.random(order_count) < CANCELLED_SHARE, 'Cancelled', 'Active')
+
+    #edit dates start within 20 days of closed won and move forward by up to MAX_STEP_DAYS per audit row
+    steps = rng.uniform(1 / 24, MAX_STEP_DAYS, len(order))
+    starts = np.flatnonzero(np.r_[True, order[1:] != order[:-1]])
+    steps[starts] = rng.uniform(1 / 24, 20, order_count)
+    elapsed = np.cumsum(steps)
+    elapsed -= np.repeat(elapsed[starts] - steps[starts], np.diff(np.r_[starts, len(order)]))
+    edit_dates = closed_won[order] + pd.to_timedelta(elapsed, unit='D')
+
+    supply_chain = pd.DataFrame({
+        REF_COL: references[order],
+        'Opportunity': opportunities[order],
+        'Account Name': accounts[order],
+        'Edited By': 'Synthetic User',
+        'Field / Event': field_event,
+        'Old Value': old_value,
+        'New Value': new_value,
+        'Edit Date': edit_dates,
+        'Status': status[order],
+    })
+    if shuffle:
+        supply_chain = supply_chain.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    #sales report with one row per opportunity, some opportunities are missing or have no closed won date
+    in_sales = rng.random(order_count) >= MISSING_SALES_SHARE
+    sales = pd.DataFrame({
+        'Opportunity Name': opportunities,
+        'Account Name': accounts,
+        '18 Char ID': np.char.add('ID', np.char.zfill(np.arange(order_count).astype(str), 16)),
+        'Closed won date': closed_won.where(rng.random(order_count) >= MISSING_CLOSED_WON_SHARE),
+        'Opportunity Type': rng.choice(OPPORTUNITY_TYPES, order_count),
+        'Asset Type': rng.choice(ASSET_TYPES, order_count),
+    })[in_sales].reset_index(drop=True)
+    return supply_chain, sales
+
+
+#create a function that writes a report as an Excel or CSV file
+def write_report(df, path):
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+#create the command line interface
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic supply chain and sales reports.')
+    parser.add_argument('rows', type=int, help='approximate number of audit rows in the supply chain report')
+    parser.add_argument('--out', default='.', help='directory the reports are written to (default: current directory)')
+    parser.add_argument('--name', default='synthetic', help='report name, the files are <name>_supply_chain and <name>_sales (default: synthetic)')
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx', help='file format (default: xlsx)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--comment-rows', type=float, default=0, help='average number of audit rows per order that do not change the status (default: 0)')
+    parser.add_argument('--shuffle', action='store_true', help='shuffle the audit rows instead of keeping each order history together')
+    args = parser.parse_args(argv)
+
+    supply_chain, sales = generate_reports(args.rows, args.seed, args.comment_rows, args.shuffle)
+    os.makedirs(args.out, exist_ok=True)
+    write_report(supply_chain, os.path.join(args.out, f'{args.name}_supply_chain.{args.format}'))
+    write_report(sales, os.path.join(args.out, f'{args.name}_sales.{args.format}'))
+    print(f'{len(supply_chain)} audit rows for {supply_chain[REF_COL].nunique()} shipping reference numbers written to {args.out}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#tests of the SLA engine on small hand-made and synthetic reports
+#usage:
+#   pip install -r requirements-dev.txt
+#   python -m pytest test_sla_engine.py
+
+#import necessary packages
+import pandas as pd
+import pytest
+from sla_calendar import BusinessCalendar, business_calendar
+from sla_engine import DEMO_ACCOUNT, clock_days, compute_sla_frames, merge_reports
+from sla_figures import build_statistics_table, build_statistics_text
+from sla_ingest import SUPPLY_CHAIN_COLUMNS, parse_report
+from sla_state import ReferenceStateStore
+from sla_stream import compute_sla_frames_streaming
+from sla_synthetic import generate_reports
+
+
+#calendar counting whole weekdays without holidays, used to check that every path measures the same working time
+WEEKDAYS = BusinessCalendar(name='Working days (test)')
+
+
+#create a function that builds a supply chain report of one order that is confirmed, accepted and shipped without going out of stock
+def supply_chain_report():
+    return pd.DataFrame({
+        'Shipping Details: Ref No.': ['SR-1', 'SR-1', 'SR-1', 'SR-1'],
+        'Opportunity': ['Opp 1', 'Opp 1', 'Opp 1', 'Opp 1'],
+        'Account Name': ['Account 1', 'Account 1', 'Account 1', 'Account 1'],
+        'Field / Event': ['Created.', 'Status', 'Status', 'Status'],
+        'Old Value': [None, 'Not confirmed', 'Confirmed', 'Order accepted'],
+        'New Value': [None, 'Confirmed', 'Order accepted', 'Shipped'],
+        'Edit Date': pd.to_datetime(['2024-03-01 09:00', '2024-03-02 09:00', '2024-03-04 12:00', '2024-03-08 09:00']),
+        'Status': ['Shipped', 'Shipped', 'Shipped', 'Shipped'],
+    })
+
+
+#create a function that builds a sales report with the closed won date of the order's opportunity
+def sales_report(opportunity='Opp 1'):
+    return pd.DataFrame({
+        'Opportunity Name': [opportunity],
+        'Account Name': ['Account 1'],
+        'Closed won date': pd.to_datetime(['2024-02-28']),
+        'Opportunity Type': ['New Business'],
+        'Asset Type': ['Hardware'],
+    })
+
+
+#a report without stock-outs still describes every stage numerically, the out of stock stage has a count of 0
+def test_report_without_out_of_stock_events():
+    result = compute_sla_frames(supply_chain_report(), sales_report())
+    out_of_stock = result.df_list[5]
+    assert out_of_stock['Time Elapsed (Days)'].dtype == float
+    assert out_of_stock['Time Elapsed (Days)'].isna().all()
+    assert all(len(stats) == 8 for stats in result.stats)
+    assert result.stats[5][0] == 0
+    assert result.stats[1][1] == 1.0
+    #the summary text and table are built from the eight entry describe output
+    assert len(build_statistics_text(result)) == len(result.stats)
+    assert len(build_statistics_table(result)) == len(result.stats)
+
+
+#a sales report that matches no opportunity leaves the closed won to created stage empty instead of failing the report
+def test_sales_report_without_matching_opportunities():
+    result = compute_sla_frames(supply_chain_report(), sales_report('Other Opp'))
+    closed_won_to_created = result.df_list[0]
+    assert closed_won_to_created['Time Elapsed (Days)'].dtype == float
+    assert result.stats[0][0] == 0
+    assert len(build_statistics_text(result)) == len(result.stats)
+
+
+#create a function that checks two results hold the same stage dataframes and total order times
+def assert_same_result(result, expected):
+    for df, expected_df in zip(result.df_list, expected.df_list):
+        pd.testing.assert_frame_equal(df.reset_index(drop=True), expected_df.reset_index(drop=True))
+    assert result.total_times == expected.total_times
+
+
+#incremental processing gives the same stage tables as processing the whole upload, with and without a business calendar
+@pytest.mark.parametrize('calendar', [None, WEEKDAYS])
+def test_incremental_cold_start(tmp_path, calendar):
+    supply_chain, sales = generate_reports(2000)
+    store = ReferenceStateStore(str(tmp_path / 'state.feather'))
+    assert_same_result(compute_sla_frames(supply_chain, sales, store, calendar), compute_sla_frames(supply_chain, sales, None, calendar))
+
+
+@pytest.mark.parametrize('calendar', [None, WEEKDAYS])
+def test_incremental_append(tmp_path, calendar):
+    supply_chain, sales = generate_reports(2000)
+    #the first upload holds the oldest 80% of the audit rows, the second upload appends the rest
+    first = supply_chain[supply_chain['Edit Date'] <= supply_chain['Edit Date'].quantile(0.8)]
+    store = ReferenceStateStore(str(tmp_path / 'state.feather'))
+    compute_sla_frames(first, sales, store, calendar)
+    assert_same_result(compute_sla_frames(supply_chain, sales, store, calendar), compute_sla_frames(supply_chain, sales, None, calendar))
+
+
+@pytest.mark.parametrize('calendar', [None, WEEKDAYS])
+def test_incremental_edited_old_row(tmp_path, calendar):
+    supply_chain, sales = generate_reports(2000)
+    store = ReferenceStateStore(str(tmp_path / 'state.feather'))
+    compute_sla_frames(supply_chain, sales, store, calendar)
+    #move an old status change back by two days without adding any newer rows
+    edited = supply_chain.copy()
+    row = edited.index[(edited['Field / Event'] == 'Status') & (edited['New Value'] == 'Confirmed')][0]
+    edited.loc[row, 'Edit Date'] -= pd.Timedelta(days=2)
+    result = compute_sla_frames(edited, sales, store, calendar)
+    assert_same_result(result, compute_sla_frames(edited, sales, None, calendar))
+    #the edit is picked up, the created to confirmed durations differ from the first upload
+    assert not result.df_list[1].equals(compute_sla_frames(supply_chain, sales, None, calendar).df_list[1])
+
+
+#a first upload without any shipping reference number has nothing stored to reuse
+def test_incremental_empty_first_upload(tmp_path):
+    store = ReferenceStateStore(str(tmp_path / 'state.feather'))
+    result = compute_sla_frames(supply_chain_report().iloc[:0], sales_report(), store)
+    assert result.total_times == {}
+
+
+#create a function that builds a supply chain report of one created and confirmed order followed by the given status changes, as (old value, new value, edit date)
+def status_report(status_changes):
+    rows = [('Created.', None, None, '2024-03-01 09:00'), ('Status', 'Not confirmed', 'Confirmed', '2024-03-01 12:00')]
+    rows += [('Status', old_value, new_value, edit_date) for old_value, new_value, edit_date in status_changes]
+    field_events, old_values, new_values, edit_dates = zip(*rows)
+    return pd.DataFrame({
+        'Shipping Details: Ref No.': 'SR-1',
+        'Opportunity': 'Opp 1',
+        'Account Name': 'Account 1',
+        'Field / Event': field_events,
+        'Old Value': old_values,
+        'New Value': new_values,
+        'Edit Date': pd.to_datetime(edit_dates),
+        'Status': 'Active',
+    })
+
+
+#create a function that returns the out of stock row of the only order of a status report, None when the order has no stock-out
+#orders without a stock-out are left out of the out of stock dataframe and flagged as not out of stock in the others
+def out_of_stock_row(status_changes):
+    result = compute_sla_frames(status_report(status_changes), sales_report())
+    if result.df_list[5].empty:
+        assert result.df_list[1]['Order Out of Stock'].tolist() == ['No']
+        return None
+    return result.df_list[5].iloc[0]
+
+
+#every stock-out of an order is paired with its own return to stock, the time elapsed adds them up
+def test_out_of_stock_two_cycles():
+    row = out_of_stock_row([
+        ('Confirmed', 'Out of stock', '2024-03-02 09:00'),
+        ('Out of stock', 'Order accepted', '2024-03-04 09:00'),
+        ('Order accepted', 'Out of stock', '2024-03-05 09:00'),
+        ('Out of stock', 'Order accepted', '2024-03-08 21:00'),
+    ])
+    assert row['Order Status Change'] == 'Out of Stock'
+    assert row['Out of Stock Count'] == 2
+    assert row['Time Elapsed (Days)'] == 5.5
+    assert row['Longest Out of Stock (Days)'] == 3.5
+    assert row['Order Out of Stock'] == 'Out of Stock'
+
+
+#a stock-out that has not ended is not counted, only the stock-outs before it are
+def test_out_of_stock_without_return_to_stock():
+    assert out_of_stock_row([('Confirmed', 'Out of stock', '2024-03-02 09:00')]) is None
+    row = out_of_stock_row([
+        ('Confirmed', 'Out of stock', '2024-03-02 09:00'),
+        ('Out of stock', 'Order accepted', '2024-03-04 09:00'),
+        ('Order accepted', 'Out of stock', '2024-03-05 09:00'),
+    ])
+    assert row['Out of Stock Count'] == 1
+    assert row['Time Elapsed (Days)'] == 2.0
+
+
+#a return to stock without an earlier stock-out is not counted
+def test_return_to_stock_without_out_of_stock():
+    assert out_of_stock_row([('Out of stock', 'Order accepted', '2024-03-02 09:00')]) is None
+    row = out_of_stock_row([
+        ('Out of stock', 'Order accepted', '2024-03-02 09:00'),
+        ('Order accepted', 'Out of stock', '2024-03-03 09:00'),
+        ('Out of stock', 'Order accepted', '2024-03-04 21:00'),
+    ])
+    assert row['Out of Stock Count'] == 1
+    assert row['Time Elapsed (Days)'] == 1.5
+
+
+#streaming a CSV report in chunks shorter than the audit trail of one order gives the same result as reading the whole report
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_streaming_matches_in_memory(shuffle):
+    supply_chain, sales = generate_reports(300, comment_rows=6, shuffle=shuffle)
+    assert supply_chain.groupby('Shipping Details: Ref No.').size().max() > 7
+    report = supply_chain.to_csv(index=False).encode()
+    result = compute_sla_frames_streaming(report, 'report.csv', sales, chunk_rows=7)
+    assert_same_result(result, compute_sla_frames(parse_report(report, 'report.csv', SUPPLY_CHAIN_COLUMNS), sales))
+
+
+#the merge keeps one row per audit row, joins the last sales row of a duplicated opportunity and leaves the sales columns empty without a sales row
+#audit rows are grouped by opportunity in order of first appearance and keep their report order within an opportunity, demo account rows are removed
+def test_merge_reports_duplicate_and_missing_sales_rows():
+    supply_chain = pd.DataFrame({
+        'Shipping Details: Ref No.': ['SR-2', 'SR-1', 'SR-2', 'SR-3', 'SR-1', 'SR-4'],
+        'Opportunity': ['Opp B', 'Opp A', 'Opp B', 'Opp C', 'Opp A', 'Opp D'],
+        'Account Name': ['Account 1', 'Account 1', 'Account 1', 'Account 1', 'Account 1', DEMO_ACCOUNT],
+        'Field / Event': 'Status',
+        'Old Value': 'Not confirmed',
+        'New Value': 'Confirmed',
+        'Edit Date': pd.date_range('2024-03-01', periods=6),
+        'Status': 'Active',
+    })
+    sales = pd.DataFrame({
+        'Opportunity Name': ['Opp A', 'Opp B', 'Opp A'],
+        'Account Name': 'Account 1',
+        'Closed won date': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-02-15']),
+        'Opportunity Type': ['First', 'Only', 'Last'],
+        'Asset Type': ['Hardware', 'Fleet', 'Telematics'],
+    })
+    merged = merge_reports(supply_chain, sales)
+    assert merged['Shipping Details: Ref No.'].tolist() == ['SR-2', 'SR-2', 'SR-1', 'SR-1', 'SR-3']
+    assert merged['Edit Date'].dt.day.tolist() == [1, 3, 2, 5, 4]
+    assert merged['Opportunity Type'].tolist()[:4] == ['Only', 'Only', 'Last', 'Last']
+    assert merged['Asset Type'].tolist()[2:4] == ['Telematics', 'Telematics']
+    assert merged['Closed won date'].tolist()[2] == pd.Timestamp('2024-02-15')
+    assert merged.iloc[4][['Closed won date', 'Opportunity Type', 'Asset Type']].isna().all()
+    assert list(merged.index) == list(range(5))
+
+
+#create a function that measures the days between two edit dates on the SLA clock of a business calendar
+def clock(calendar, start, end):
+    working_time = calendar.working_time(pd.to_datetime([start, end]).values.view('i8'))
+    return clock_days(working_time[1:] - working_time[:1], calendar)[0]
+
+
+#working days skip weekends and holidays but count the whole of every working day
+def test_working_days_skip_weekends_and_holidays(tmp_path):
+    calendar = business_calendar('Working days', 'Weekends only', str(tmp_path / 'holidays.csv'))
+    assert clock(calendar, '2024-03-08 12:00', '2024-03-11 12:00') == 1.0
+    assert clock(calendar, '2024-03-09 10:00', '2024-03-10 15:00') == 0.0
+    assert clock(calendar, '2024-03-09 10:00', '2024-03-11 12:00') == 0.5
+    #4 July 2024 is a Thursday and a US federal holiday
+    calendar = business_calendar('Working days', 'US Federal', str(tmp_path / 'holidays.csv'))
+    assert clock(calendar, '2024-07-03 12:00', '2024-07-05 12:00') == 1.0
+    assert clock(calendar, '2024-07-04 08:00', '2024-07-04 18:00') == 0.0
+
+
+#business hours only count 9:00 to 17:00 of every working day and are reported in business days of 8 hours
+def test_business_hours_span_weekends_and_holidays(tmp_path):
+    calendar = business_calendar('Business hours', 'US Federal', str(tmp_path / 'holidays.csv'))
+    assert clock(calendar, '2024-03-08 15:00', '2024-03-11 11:00') == 0.5
+    assert clock(calendar, '2024-03-11 07:00', '2024-03-11 13:00') == 0.5
+    assert clock(calendar, '2024-03-11 20:00', '2024-03-12 09:00') == 0.0
+    assert clock(calendar, '2024-07-03 13:00', '2024-07-05 13:00') == 1.0
+    assert clock(calendar, '2024-07-03 15:00', '2024-07-08 11:00') == 1.5
+
+
+#regions of the holidays CSV file are read with their dates
+def test_holidays_file_region(tmp_path):
+    path = tmp_path / 'holidays.csv'
+    path.write_text('region,date\nUK,2024-12-25\nUK,2024-12-26\n')
+    calendar = business_calendar('Working days', 'UK', str(path))
+    assert calendar.holidays == ('2024-12-25', '2024-12-26')
+    assert clock(calendar, '2024-12-24 12:00', '2024-12-27 12:00') == 1.0
+
+
+#every stage is measured on the SLA clock, the order is created on a Friday and confirmed on a Saturday
+def test_stage_tables_on_working_days():
+    result = compute_sla_frames(supply_chain_report(), sales_report(), calendar=WEEKDAYS)
+    assert result.df_list[1]['Time Elapsed (Days)'].tolist() == [0.6]
+    assert result.df_list[2]['Time Elapsed (Days)'].tolist() == [0.5]
+    assert result.df_list[3]['Time Elapsed (Days)'].tolist() == [3.9]